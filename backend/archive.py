@@ -0,0 +1,158 @@
+"""
+Reservation archival: bookings whose visit date is past a horizon leave the hot reservations
+collection for an archive collection or monthly gzipped NDJSON files
+"""
+import asyncio
+import gzip
+import logging
+import time
+from datetime import date, timedelta
+from itertools import groupby
+from pathlib import Path
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from jobs import JobQueue
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_JOB = "archive_reservations"
+
+DUPLICATE_KEY = 11000
+
+# Only dates in this form compare correctly as strings: reservations imported with another
+# format stay in the hot collection
+ISO_DATE = r"^\d{4}-\d{2}-\d{2}$"
+
+
+class CollectionArchive:
+    """Archived reservations stay queryable, in a collection of their own (see include_archived)"""
+
+    queryable = True
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def write(self, documents: List[dict]) -> None:
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Already archived by a run interrupted before its delete: the copy is identical
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+
+
+class FileArchive:
+    """
+    One reservations-YYYY-MM.ndjson.gz file per month of visit date under directory.
+
+    Each write appends a gzip member, which gunzip and gzip.open read back as one stream.
+    A run interrupted between writing and deleting a batch archives it twice: readers
+    should deduplicate on id.
+    """
+
+    queryable = False
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def path(self, month: str) -> Path:
+        return self.directory / f"reservations-{month}.ndjson.gz"
+
+    def _append(self, documents: List[dict]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for month, group in groupby(documents, key=lambda document: document["date"][:7]):
+            lines = b"".join(dumps({k: v for k, v in document.items() if k != "_id"}) + b"\n" for document in group)
+            with gzip.open(self.path(month), "ab") as archive:
+                archive.write(lines)
+
+    async def write(self, documents: List[dict]) -> None:
+        # Documents come sorted by date, so each month is appended in one piece
+        await asyncio.get_running_loop().run_in_executor(None, self._append, documents)
+
+
+class ReservationArchiver:
+    """
+    Moves reservations whose visit is more than after_days old to store, batch_size at a time:
+    each batch is written to the archive, then deleted from the hot collection.
+
+    The work runs as a job of the outbox queue, so a single worker process archives at a time
+    and a failed run is retried. Every process enqueues the job of the current interval; the
+    job key makes those enqueues collapse into one.
+    """
+
+    def __init__(
+        self,
+        collection,
+        store,
+        job_queue: JobQueue,
+        after_days: int = 365,
+        batch_size: int = 1000,
+        interval: float = 86400.0,
+    ):
+        self.collection = collection
+        self.store = store
+        self.job_queue = job_queue
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def cutoff(self, today: Optional[date] = None) -> str:
+        """Visit dates strictly before this one (ISO, like the date field) get archived"""
+        return ((today or date.today()) - timedelta(days=self.after_days)).isoformat()
+
+    async def archive(self, today: Optional[date] = None) -> int:
+        """Archive every reservation past the horizon; returns how many were moved"""
+        if not self.enabled:
+            return 0
+        query = {"date": {"$lt": self.cutoff(today), "$regex": ISO_DATE}}
+        moved = 0
+        while True:
+            batch = await self.collection.find(query).sort("date", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+            await self.store.write(batch)
+            await self.collection.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+            moved += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        if moved:
+            logger.info(f"Archived {moved} reservations with a visit before {query['date']['$lt']}")
+        return moved
+
+    async def run(self, payload: dict) -> None:
+        """Job handler"""
+        await self.archive()
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._schedule())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule(self) -> None:
+        while True:
+            period = int(time.time() // self.interval)
+            try:
+                await self.job_queue.enqueue_once(f"{ARCHIVE_JOB}:{period}", ARCHIVE_JOB, {})
+            except PyMongoError as e:
+                logger.warning(f"Could not schedule reservation archival, retrying: {e}")
+                await asyncio.sleep(min(60.0, self.interval))
+                continue
+            # Wake up at the start of the next interval
+            await asyncio.sleep((period + 1) * self.interval - time.time())
@@ -0,0 +1,185 @@
+"""
+Capacity-aware reservation slots backed by per-slot occupancy counters
+"""
+import logging
+import math
+import re
+from collections import Counter
+from datetime import date as date_type
+from typing import Dict, List, NamedTuple, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Reservations in these states hold seats
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+
+class SlotError(ValueError):
+    """The requested date/time is malformed or outside opening hours"""
+
+
+class Capacity(NamedTuple):
+    tables: int
+    seats_per_table: int
+    seats: int
+
+    def tables_for(self, guests: int) -> int:
+        return max(1, math.ceil(guests / self.seats_per_table))
+
+
+class Slot(NamedTuple):
+    date: str
+    time: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.date}T{self.time}"
+
+
+def party_size(guests: str) -> int:
+    """Number of guests from the free-text field ("2", "8+", "4 personnes")"""
+    match = re.match(r"\s*(\d+)", str(guests))
+    if not match or int(match.group(1)) < 1:
+        raise SlotError(f"Invalid number of guests: {guests!r}")
+    return int(match.group(1))
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class AvailabilityService:
+    def __init__(self, collection, hours: Dict[str, dict], capacity: Capacity, slot_minutes: int = 30):
+        self.collection = collection
+        self.hours = hours
+        self.capacity = capacity
+        self.slot_minutes = slot_minutes
+
+    def slots_for(self, day: str) -> List[str]:
+        """Start times of every slot on a given YYYY-MM-DD date"""
+        try:
+            weekday = WEEKDAYS[date_type.fromisoformat(day).weekday()]
+        except ValueError:
+            raise SlotError(f"Invalid date: {day!r}, expected YYYY-MM-DD")
+        hours = self.hours.get(weekday)
+        if not hours:
+            return []
+        start, end = _minutes(hours["open"]), _minutes(hours["close"])
+        return [_hhmm(m) for m in range(start, end, self.slot_minutes)]
+
+    def slot_for(self, day: str, time: str) -> Slot:
+        """The slot containing a requested time, which must fall within opening hours"""
+        slots = self.slots_for(day)
+        try:
+            requested = _minutes(time)
+        except ValueError:
+            raise SlotError(f"Invalid time: {time!r}, expected HH:MM")
+        if not slots or not _minutes(slots[0]) <= requested < _minutes(slots[-1]) + self.slot_minutes:
+            raise SlotError(f"Le restaurant est fermé le {day} à {time}")
+        start = _minutes(slots[0])
+        return Slot(day, _hhmm(start + (requested - start) // self.slot_minutes * self.slot_minutes))
+
+    async def reserve(self, slot: Slot, guests: int) -> bool:
+        """Atomically take seats in a slot; False when it would go over capacity"""
+        tables = self.capacity.tables_for(guests)
+        if tables > self.capacity.tables or guests > self.capacity.seats:
+            return False
+        try:
+            # A missing slot document is created by the upsert. An existing one that is too
+            # full fails the filter, so the upsert collides on _id instead of overbooking.
+            await self.collection.update_one(
+                {
+                    "_id": slot.key,
+                    "tables": {"$lte": self.capacity.tables - tables},
+                    "seats": {"$lte": self.capacity.seats - guests},
+                },
+                {
+                    "$inc": {"tables": tables, "seats": guests},
+                    "$setOnInsert": {"date": slot.date, "time": slot.time},
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def release(self, slot: Slot, guests: int) -> None:
+        await self.collection.update_one(
+            {"_id": slot.key},
+            {"$inc": {"tables": -self.capacity.tables_for(guests), "seats": -guests}},
+        )
+
+    async def add_many(self, bookings: List[tuple]) -> None:
+        """Count (slot, guests) bookings without enforcing capacity, for imports"""
+        tables, seats = Counter(), Counter()
+        for slot, guests in bookings:
+            tables[slot] += self.capacity.tables_for(guests)
+            seats[slot] += guests
+        if not seats:
+            return
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": slot.key},
+                {
+                    "$inc": {"tables": tables[slot], "seats": seats[slot]},
+                    "$setOnInsert": {"date": slot.date, "time": slot.time},
+                },
+                upsert=True,
+            )
+            for slot in seats
+        ], ordered=False)
+
+    async def day(self, day: str, guests: Optional[int] = None) -> dict:
+        """Remaining capacity of every slot of a date, read from the counters"""
+        slots = self.slots_for(day)
+        occupancy = {
+            doc["time"]: doc
+            async for doc in self.collection.find({"date": day}, {"_id": 0, "time": 1, "tables": 1, "seats": 1})
+        }
+        needed_tables = self.capacity.tables_for(guests) if guests else 1
+        needed_seats = guests or 1
+        result = []
+        for time in slots:
+            used = occupancy.get(time, {})
+            tables_left = self.capacity.tables - used.get("tables", 0)
+            seats_left = self.capacity.seats - used.get("seats", 0)
+            result.append({
+                "time": time,
+                "tables_left": tables_left,
+                "seats_left": seats_left,
+                "available": tables_left >= needed_tables and seats_left >= needed_seats,
+            })
+        return {"date": day, "open": bool(slots), "slots": result}
+
+    async def rebuild(self, reservations) -> int:
+        """Recompute every counter from the active reservations"""
+        bookings = []
+        async for doc in reservations.find(
+            {"status": {"$in": list(ACTIVE_STATUSES)}},
+            {"_id": 0, "date": 1, "time": 1, "guests": 1},
+        ):
+            try:
+                bookings.append((self.slot_for(doc["date"], doc["time"]), party_size(doc["guests"])))
+            except (SlotError, KeyError):
+                continue
+        await self.collection.delete_many({})
+        await self.add_many(bookings)
+        logger.info(f"Slot occupancy rebuilt from {len(bookings)} reservations")
+        return len(bookings)
+
+
+def capacity_from_env(environ) -> Capacity:
+    tables = int(environ.get('AVAILABILITY_TABLES', '12'))
+    seats_per_table = int(environ.get('AVAILABILITY_SEATS_PER_TABLE', '4'))
+    seats = int(environ.get('AVAILABILITY_SEATS', str(tables * seats_per_table)))
+    return Capacity(tables, seats_per_table, seats)
@@ -0,0 +1,263 @@
+"""
+In-process response cache for the public catalog endpoints
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from coalescing import SingleFlight
+from metrics import RESPONSE_CACHE_LOOKUPS
+from responses import dumps as serialize
+
+logger = logging.getLogger(__name__)
+
+# Collections backing cached endpoints, mapped to their cache namespace
+COLLECTION_NAMESPACES = {
+    "restaurant": "restaurant",
+    "menu_categories": "menu",
+    "reviews": "reviews",
+    # Rewritten on its own by manage.py rebuild-review-stats
+    "review_stats": "reviews",
+    "gallery": "gallery",
+    # The menu version is bumped right after each menu write: its change reaches the other
+    # workers once the version they rebuild their search index against is current
+    "catalog_versions": "menu",
+}
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong validator derived from the serialized content"""
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class Payload(NamedTuple):
+    """Loader result carrying response headers to cache along with the data"""
+    data: Any
+    headers: Dict[str, str]
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    last_modified: str
+    headers: Dict[str, str] = {}
+
+
+class ResponseCache:
+    """Serialized response bodies keyed by (namespace, key) with TTL and LRU eviction"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300.0,
+        settle_seconds: float = 0.0,
+        flights: Optional[SingleFlight] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # When reads may come from lagging secondaries, entries loaded shortly after an
+        # invalidation only live until the lag bound has passed, then get reloaded
+        self.settle_seconds = settle_seconds
+        self._settling: Dict[str, float] = {}
+        # Misses of the same entry at the same time share one load
+        self.flights = flights
+        # Bumped by every invalidation: a load that started before one doesn't store its result
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, CachedResponse]]" = OrderedDict()
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: str = "") -> Optional[CachedResponse]:
+        entry = self._entries.get((namespace, key))
+        if entry is None or entry[0] < time.monotonic():
+            # Expired entries stay in place until reloaded so an unchanged body keeps its Last-Modified
+            self.misses += 1
+            RESPONSE_CACHE_LOOKUPS.inc("miss")
+            return None
+        self._entries.move_to_end((namespace, key))
+        self.hits += 1
+        RESPONSE_CACHE_LOOKUPS.inc("hit")
+        return entry[1]
+
+    def generation(self, namespace: str) -> Tuple[int, int]:
+        return self._global_generation, self._generations.get(namespace, 0)
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        body: bytes,
+        headers: Dict[str, str] = None,
+        generation: Optional[Tuple[int, int]] = None,
+    ) -> CachedResponse:
+        """
+        Store a response body. With the generation() read before loading it, the body is
+        only returned, not stored, when the namespace was invalidated meanwhile.
+        """
+        etag = compute_etag(body)
+        if generation is not None and generation != self.generation(namespace):
+            return CachedResponse(body, etag, formatdate(usegmt=True), headers or {})
+        previous = self._entries.get((namespace, key))
+        if previous is not None and previous[1].etag == etag:
+            last_modified = previous[1].last_modified
+        else:
+            last_modified = formatdate(usegmt=True)
+        cached = CachedResponse(body, etag, last_modified, headers or {})
+        now = time.monotonic()
+        expires_at = now + self.ttl
+        settled_at = self._settling.get(namespace)
+        if settled_at is not None:
+            if settled_at > now:
+                expires_at = min(expires_at, settled_at)
+            else:
+                del self._settling[namespace]
+        self._entries[(namespace, key)] = (expires_at, cached)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached
+
+    def add_listener(self, listener: Callable[[Optional[str]], None]) -> None:
+        """Call listener(namespace) on every invalidation, for data derived from the same collections"""
+        self._listeners.append(listener)
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Drop every entry of a namespace, or the whole cache when no namespace is given"""
+        for listener in self._listeners:
+            listener(namespace)
+        if self.settle_seconds:
+            settled_at = time.monotonic() + self.settle_seconds
+            for settling in [namespace] if namespace else set(COLLECTION_NAMESPACES.values()):
+                self._settling[settling] = settled_at
+        if namespace is None:
+            self._global_generation += 1
+        else:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        if self.flights is not None:
+            self.flights.forget(namespace)
+        if namespace is None:
+            self._entries.clear()
+            return
+        for cache_key in [k for k in self._entries if k[0] == namespace]:
+            del self._entries[cache_key]
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Optional[CachedResponse]:
+        """Return the cached response, or load, serialize and store it. A None payload is not cached."""
+        cached = self.get(namespace, key)
+        if cached is not None:
+            return cached
+        if self.flights is not None:
+            return await self.flights.do(namespace, key, lambda: self._load(namespace, key, loader))
+        return await self._load(namespace, key, loader)
+
+    async def _load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Optional[CachedResponse]:
+        generation = self.generation(namespace)
+        data = await loader()
+        if data is None:
+            return None
+        if isinstance(data, Payload):
+            return self.set(namespace, key, serialize(data.data), data.headers, generation)
+        return self.set(namespace, key, serialize(data), generation=generation)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CacheInvalidator:
+    """
+    Invalidates cache namespaces when their backing collections change.
+
+    Uses a database-wide change stream when the deployment supports it (replica sets,
+    sharded clusters) and otherwise polls the collection hashes reported by dbHash.
+    """
+
+    def __init__(self, db, cache: ResponseCache, poll_interval: float = 30.0):
+        self.db = db
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                logger.info(f"Change streams unavailable ({e.code}), polling collection hashes instead")
+                await self._poll()
+                return
+            except PyMongoError as e:
+                # The stream died (failover, network); anything may have changed meanwhile
+                logger.warning(f"Cache change stream interrupted: {e}")
+                self.cache.invalidate()
+                await asyncio.sleep(self.poll_interval)
+            except Exception as e:
+                # Drivers or stand-ins without watch support at all
+                logger.warning(f"Cache invalidation disabled, relying on TTL expiry: {e!r}")
+                self.mode = "ttl"
+                return
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"ns.coll": {"$in": list(COLLECTION_NAMESPACES)}}}]
+        async with self.db.watch(pipeline) as stream:
+            self.mode = "change_stream"
+            logger.info("Cache invalidation listening on change streams")
+            async for change in stream:
+                namespace = COLLECTION_NAMESPACES.get(change.get("ns", {}).get("coll"))
+                if namespace is None:
+                    self.cache.invalidate()
+                else:
+                    self.cache.invalidate(namespace)
+
+    async def _poll(self) -> None:
+        self.mode = "polling"
+        hashes: Optional[Dict[str, str]] = None
+        while True:
+            try:
+                result = await self.db.command("dbHash", collections=list(COLLECTION_NAMESPACES))
+            except OperationFailure as e:
+                logger.warning(f"dbHash unavailable ({e.code}), cache relies on TTL expiry only")
+                self.mode = "ttl"
+                return
+            except PyMongoError as e:
+                logger.warning(f"Cache polling failed: {e}")
+                self.cache.invalidate()
+                hashes = None
+            else:
+                current = result.get("collections", {})
+                for collection, namespace in COLLECTION_NAMESPACES.items():
+                    if hashes is not None and hashes.get(collection) != current.get(collection):
+                        self.cache.invalidate(namespace)
+                hashes = current
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,60 @@
+"""
+Single-flight request coalescing: concurrent identical reads share one in-flight query
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import COALESCED_READS
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Runs at most one load per (namespace, key) at a time: callers asking for a key already
+    being loaded await that load and share its result, or its exception.
+
+    The load runs in a task of its own, so a caller going away does not cancel it for the
+    others. forget() makes later callers start a fresh load rather than join one that may
+    have read the data before a change. Only the namespaces given are coalesced, all of
+    them when namespaces is None.
+    """
+
+    def __init__(self, namespaces: Optional[Iterable[str]] = None):
+        self.namespaces = None if namespaces is None else frozenset(namespaces)
+        self._flights: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def enabled_for(self, namespace: str) -> bool:
+        return self.namespaces is None or namespace in self.namespaces
+
+    async def do(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled_for(namespace):
+            return await loader()
+        flight_key = (namespace, key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = asyncio.ensure_future(loader())
+            self._flights[flight_key] = flight
+            flight.add_done_callback(lambda done: self._landed(flight_key, done))
+        else:
+            COALESCED_READS.inc(namespace)
+        return await asyncio.shield(flight)
+
+    def _landed(self, flight_key: Tuple[str, str], flight: asyncio.Future) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        # Every caller may have gone away: mark the exception as retrieved, it was logged by the handler
+        if not flight.cancelled():
+            flight.exception()
+
+    def forget(self, namespace: Optional[str] = None) -> None:
+        """
+        Let in-flight loads of a namespace, or of all of them, finish without new callers.
+        Their results still reach their own callers; ResponseCache doesn't store them.
+        """
+        for flight_key in [k for k in self._flights if namespace is None or k[0] == namespace]:
+            del self._flights[flight_key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,230 @@
+"""
+Negotiated response compression (zstd, brotli, gzip) with a cache of precompressed bodies
+"""
+import asyncio
+import gzip
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Levels used when a route has no override: cheap enough to run on every response
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# Bodies at least this large are compressed in a worker thread; all three codecs release the GIL
+THREAD_THRESHOLD = 256 * 1024
+
+
+def available_encodings(preference: Iterable[str]) -> List[str]:
+    """Codings from preference that can actually be produced here"""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [coding for coding in preference if installed.get(coding)]
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Codings of an Accept-Encoding header with their q-values"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(header: Optional[str], available: Iterable[str]) -> str:
+    """First available coding the client accepts, identity unless explicitly refused"""
+    accepted = parse_accept_encoding(header)
+    for coding in available:
+        if coding == "identity":
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def compress(body: bytes, coding: str, level: int) -> bytes:
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    if coding == "br":
+        return brotli.compress(body, quality=level, mode=brotli.MODE_TEXT)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor flushing after every chunk so streamed rows reach the client"""
+
+    def __init__(self, coding: str, level: int):
+        self.coding = coding
+        if coding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif coding == "br":
+            self._compressor = brotli.Compressor(quality=level, mode=brotli.MODE_TEXT)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.coding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.coding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.coding == "zstd":
+            return self._compressor.flush()
+        if self.coding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with the best coding the client accepts.
+
+    Responses already encoded, of a non-text type or smaller than minimum_size are left
+    alone. Complete bodies carrying an ETag are compressed once per (ETag, coding) and
+    served from an LRU afterwards; streamed bodies are compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        encodings: Iterable[str] = ("zstd", "br", "gzip"),
+        levels: Optional[Dict[str, int]] = None,
+        route_levels: Optional[Dict[str, Dict[str, int]]] = None,
+        cache_entries: int = 256,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings(encodings)
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.route_levels = route_levels or {}
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[Tuple[str, str, int], bytes]" = OrderedDict()
+
+    def level_for(self, scope, coding: str) -> int:
+        route = scope.get("route")
+        overrides = self.route_levels.get(getattr(route, "path", None), {})
+        return overrides.get(coding, self.levels[coding])
+
+    async def _compress_body(self, body: bytes, coding: str, level: int, etag: Optional[str]) -> bytes:
+        key = (etag, coding, level)
+        if etag is not None:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        if len(body) >= THREAD_THRESHOLD:
+            compressed = await asyncio.to_thread(compress, body, coding, level)
+        else:
+            compressed = compress(body, coding, level)
+        if etag is not None:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        if coding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        stream: Optional[StreamCompressor] = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough, stream
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] < 200
+                    or message["status"] in (204, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(scope=start_message)
+
+            if stream is None and not more_body:
+                # Complete body in a single message
+                if len(body) < self.minimum_size:
+                    headers.add_vary_header("Accept-Encoding")
+                    await send(start_message)
+                    await send(message)
+                    return
+                etag = headers.get("etag")
+                if etag and start_message["status"] != 200:
+                    etag = None
+                body = await self._compress_body(body, coding, self.level_for(scope, coding), etag)
+                self._encode_headers(headers, coding)
+                headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if stream is None:
+                stream = StreamCompressor(coding, self.level_for(scope, coding))
+                self._encode_headers(headers, coding)
+                del headers["Content-Length"]
+                await send(start_message)
+            data = stream.chunk(body) if body else b""
+            if not more_body:
+                data += stream.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _encode_headers(headers: MutableHeaders, coding: str) -> None:
+        headers["Content-Encoding"] = coding
+        headers.add_vary_header("Accept-Encoding")
+        # The encoded bytes differ from the identity representation; If-None-Match uses
+        # weak comparison so clients revalidating with either form still get their 304
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
@@ -0,0 +1,74 @@
+"""
+Streaming NDJSON / CSV exports of Mongo cursors
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from starlette.responses import StreamingResponse
+
+from responses import dumps
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def export_columns(fields: Optional[str], default: List[str]) -> List[str]:
+    """Columns requested through a comma separated fields parameter, in order"""
+    if not fields:
+        return list(default)
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def export_projection(columns: List[str]) -> dict:
+    projection = {column: 1 for column in columns}
+    projection["_id"] = 0
+    return projection
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+async def stream_rows(cursor, fmt: str, columns: List[str], batch_size: int) -> AsyncIterator:
+    """Serialize documents as they come off the cursor, one chunk per batch"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        count = 0
+        async for doc in cursor:
+            writer.writerow([_csv_value(doc.get(column)) for column in columns])
+            count += 1
+            if count >= batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                count = 0
+        yield buffer.getvalue()
+        return
+
+    lines = []
+    async for doc in cursor:
+        lines.append(dumps(doc))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines.clear()
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def export_response(cursor, fmt: str, columns: List[str], batch_size: int, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(cursor, fmt, columns, batch_size),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
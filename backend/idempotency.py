@@ -0,0 +1,96 @@
+"""
+Idempotency-Key support: the first request with a key runs, retries replay its response
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request still running, or was used for a different request"""
+
+    def __init__(self, detail: str, in_progress: bool = False):
+        super().__init__(detail)
+        self.detail = detail
+        self.in_progress = in_progress
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+
+
+def fingerprint(payload) -> str:
+    """Digest of the request payload, to refuse a key reused for a different request"""
+    return hashlib.blake2b(dumps(payload), digest_size=16).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    One document per key in a TTL-indexed collection (see indexes.py).
+
+    A key is claimed by inserting its document, so concurrent requests with the same key
+    race on the _id index and only one of them runs. Claims of requests that died without
+    completing expire after lock_seconds and can then be taken over.
+    """
+
+    def __init__(self, collection, lock_seconds: float = 30.0):
+        self.collection = collection
+        self.lock_seconds = lock_seconds
+
+    async def begin(self, scope: str, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+        """Claim a key; returns the stored response when a previous request already completed"""
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValueError(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters")
+        now = datetime.utcnow()
+        document_id = f"{scope}:{key}"
+        try:
+            await self.collection.insert_one({
+                "_id": document_id,
+                "fingerprint": request_fingerprint,
+                "state": "pending",
+                "created_at": now,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await self.collection.find_one({"_id": document_id})
+        if existing is None:
+            # Expired between the insert and the read
+            return await self.begin(scope, key, request_fingerprint)
+        if existing["fingerprint"] != request_fingerprint:
+            raise IdempotencyConflict(f"{HEADER} was already used for a different request")
+        if existing["state"] == "done":
+            return StoredResponse(existing["status_code"], bytes(existing["body"]))
+
+        taken_over = await self.collection.find_one_and_update(
+            {"_id": document_id, "state": "pending", "created_at": {"$lt": now - timedelta(seconds=self.lock_seconds)}},
+            {"$set": {"created_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken_over is None:
+            raise IdempotencyConflict("A request with this key is still being processed", in_progress=True)
+        logger.warning(f"Taking over stale idempotency key {document_id}")
+        return None
+
+    async def complete(self, scope: str, key: str, status_code: int, body: bytes) -> None:
+        await self.collection.update_one(
+            {"_id": f"{scope}:{key}"},
+            {"$set": {"state": "done", "status_code": status_code, "body": body}},
+        )
+
+    async def abandon(self, scope: str, key: str) -> None:
+        """Release a key after a failure so that a retry runs again"""
+        await self.collection.delete_one({"_id": f"{scope}:{key}", "state": "pending"})
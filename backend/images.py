@@ -0,0 +1,215 @@
+"""
+Gallery image pipeline: uploaded originals are decoded and resized into responsive variants
+in a process pool, and the variants are served as immutable static files
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from starlette.staticfiles import StaticFiles
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError, features
+except ImportError:  # optional, uploads are refused without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name, file extension and MIME type of each output format
+FORMATS = {
+    "avif": ("AVIF", "avif", "image/avif"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+# Width of the blurred placeholder inlined in the gallery documents
+PLACEHOLDER_WIDTH = 16
+
+# Variant file names embed a digest of the original, so their content never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImageError(ValueError):
+    """The upload is not an image Pillow can decode, or is too large to"""
+
+
+def available_formats(names: Sequence[str]) -> List[str]:
+    """Configured formats this Pillow build can encode, in the configured order"""
+    if Image is None:
+        return []
+    return [name for name in names if name in FORMATS and features.check(name if name != "jpeg" else "jpg")]
+
+
+def _placeholder(image) -> str:
+    """Tiny blurred WebP as a data URI, shown while the real image loads (LQIP)"""
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    thumbnail = image.convert("RGB").resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_variants(
+    data: bytes,
+    directory: str,
+    stem: str,
+    widths: Sequence[int],
+    formats: Sequence[str],
+    quality: int,
+    max_pixels: int,
+) -> dict:
+    """
+    Decode an upload and write one file per (width, format) into directory.
+
+    Runs in a worker process: takes and returns plain picklable values. Widths larger than
+    the original are skipped, the original width (capped at the largest width) always kept.
+    """
+    # Pillow only refuses images over twice MAX_IMAGE_PIXELS (and warns above it): the exact
+    # limit is checked on the header, before anything is decoded
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > max_pixels:
+            raise ImageError(f"plus de {max_pixels} pixels")
+        image.load()
+    except UnidentifiedImageError:
+        raise ImageError("format d'image non reconnu") from None
+    except Image.DecompressionBombError:
+        raise ImageError(f"plus de {max_pixels} pixels") from None
+    except OSError as e:
+        raise ImageError(f"fichier endommagé ({e})") from None
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    width, height = image.size
+    targets = sorted({w for w in widths if w < width} | {min(width, max(widths))})
+
+    variants = []
+    for target in targets:
+        resized = image if target == width else image.resize((target, round(height * target / width)), Image.LANCZOS)
+        for name in formats:
+            pillow_format, extension, _ = FORMATS[name]
+            path = Path(directory) / f"{stem}-{target}w.{extension}"
+            if not path.exists():
+                # Written under a temporary name: a concurrent upload of the same file never sees half a variant
+                partial_path = path.with_suffix(f".{os.getpid()}.tmp")
+                (resized.convert("RGB") if name == "jpeg" else resized).save(partial_path, pillow_format, quality=quality)
+                os.replace(partial_path, path)
+            variants.append({"format": name, "width": target, "height": resized.height, "file": path.name})
+    return {"width": width, "height": height, "placeholder": _placeholder(image), "variants": variants}
+
+
+class ImagePipeline:
+    """
+    Stores uploads and renders their variants in a process pool, off the event loop.
+
+    Originals are kept under originals_dir, variants under directory, both named after a
+    digest of the uploaded bytes: uploading the same file twice reuses the same files.
+    The pool is started on the first upload so that it costs nothing to processes that
+    never receive one.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        originals_dir: str,
+        url_prefix: str,
+        widths: Sequence[int] = (320, 640, 960, 1280),
+        formats: Sequence[str] = ("avif", "webp"),
+        quality: int = 75,
+        max_pixels: int = 40_000_000,
+        workers: int = 2,
+    ):
+        self.directory = Path(directory)
+        self.originals_dir = Path(originals_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.widths = sorted(widths)
+        self.formats = available_formats(formats)
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.formats)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.originals_dir.mkdir(parents=True, exist_ok=True)
+            # spawn rather than fork: the parent runs an event loop and the driver's threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def process(self, data: bytes) -> dict:
+        """Store an upload and render its variants; returns the gallery document fields"""
+        stem = hashlib.blake2b(data, digest_size=8).hexdigest()
+        render = partial(
+            render_variants, data, str(self.directory), stem,
+            self.widths, self.formats, self.quality, self.max_pixels,
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            rendered = await loop.run_in_executor(self._executor(), render)
+        except BrokenProcessPool:
+            # A worker died (out of memory on a huge image...): start a fresh pool next time
+            self.stop()
+            raise
+        await loop.run_in_executor(None, self._save_original, stem, data)
+        return self.document(rendered)
+
+    def _save_original(self, stem: str, data: bytes) -> None:
+        path = self.originals_dir / stem
+        if not path.exists():
+            path.write_bytes(data)
+
+    def url(self, file: str) -> str:
+        return f"{self.url_prefix}/{file}"
+
+    def document(self, rendered: dict) -> dict:
+        """src, srcset per format and placeholder from render_variants() output"""
+        by_format: Dict[str, List[dict]] = {}
+        for variant in rendered["variants"]:
+            by_format.setdefault(variant["format"], []).append(variant)
+        sources = [
+            {
+                "type": FORMATS[name][2],
+                "srcset": ", ".join(f"{self.url(v['file'])} {v['width']}w" for v in variants),
+            }
+            for name, variants in by_format.items()
+        ]
+        # The last format is the most widely supported: it is the <img> fallback
+        fallback = by_format[self.formats[-1]]
+        return {
+            "src": self.url(fallback[-1]["file"]),
+            "srcset": sources[-1]["srcset"],
+            "sources": sources,
+            "width": rendered["width"],
+            "height": rendered["height"],
+            "placeholder": rendered["placeholder"],
+        }
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files served with a one year, immutable Cache-Control"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
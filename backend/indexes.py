@@ -0,0 +1,172 @@
+"""
+Declarative index registry for every collection the API queries
+"""
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "reservations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # get_reservations: newest first, keyset on (created_at, id)
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="status_created_at_id",
+        ),
+        IndexModel([("date", ASCENDING)], name="date"),
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("phone", ASCENDING)], name="phone"),
+        # One active reservation per phone number and time: duplicate submissions collide here
+        IndexModel(
+            [("phone", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)],
+            name="phone_date_time_active_unique",
+            unique=True,
+            partialFilterExpression={"active": True},
+        ),
+    ],
+    # Reservations moved out by archive.py, listed with include_archived
+    "reservations_archive": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+    "outbox": [
+        IndexModel([("state", ASCENDING), ("run_at", ASCENDING)], name="state_run_at"),
+        IndexModel(
+            [("finished_at", ASCENDING)],
+            name="finished_at_ttl",
+            expireAfterSeconds=settings.OUTBOX_RETENTION_SECONDS,
+        ),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "idempotency_keys": [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=settings.IDEMPOTENCY_TTL_SECONDS,
+        ),
+    ],
+    "menu_categories": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Positional item updates match on the embedded item id
+        IndexModel([("items.id", ASCENDING)], name="items_id"),
+    ],
+    "reviews": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "slot_occupancy": [
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+    "gallery": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING)], name="category"),
+    ],
+}
+
+# Representative (collection, filter, sort) shapes of the queries issued by server.py
+QUERY_SHAPES: List[Tuple[str, dict, List[Tuple[str, int]]]] = [
+    ("reservations", {"id": ""}, []),
+    ("reservations", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("reservations", {"status": "pending"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("reservations", {"date": {"$gte": "", "$lte": ""}}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("reservations", {"date": {"$lt": ""}}, [("date", ASCENDING)]),
+    ("reservations_archive", {"id": ""}, []),
+    ("reservations_archive", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("menu_categories", {"id": ""}, []),
+    ("menu_categories", {"items.id": ""}, []),
+    ("reviews", {"id": ""}, []),
+    ("reviews", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("gallery", {"category": ""}, []),
+    ("slot_occupancy", {"date": ""}, []),
+    ("outbox", {"state": "pending", "run_at": {"$lte": ""}}, [("run_at", ASCENDING)]),
+]
+
+
+async def _create_indexes(db, collection: str, models: List[IndexModel]) -> Tuple[str, List[str]]:
+    """Build a collection's indexes one at a time, so that one failing build doesn't cancel the others"""
+    created = []
+    for model in models:
+        name = model.document["name"]
+        try:
+            created.extend(await db[collection].create_indexes([model]))
+        except OperationFailure as e:
+            # Typically a conflicting definition or duplicates blocking a unique index
+            logger.error(f"Index build failed on {collection}.{name}: {e}")
+        except PyMongoError as e:
+            logger.error(f"Index build failed on {collection}.{name}: {e}")
+    return collection, created
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every registered index, collections concurrently; existing identical indexes are left untouched"""
+    results = await asyncio.gather(*(
+        _create_indexes(db, collection, models) for collection, models in INDEXES.items()
+    ))
+    logger.info("Index build complete")
+    return {collection: names for collection, names in results if names}
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+async def index_report(db) -> dict:
+    """
+    Compare the registry with the live database.
+
+    Lists registered indexes that are missing, existing indexes that have not been used
+    since the server started ($indexStats), and the winning plan of each known query shape.
+    """
+    report = {"collections": {}, "queries": []}
+
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        declared = [model.document["name"] for model in models]
+        usage = {}
+        try:
+            async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except OperationFailure as e:
+            logger.warning(f"$indexStats unavailable on {collection}: {e}")
+
+        report["collections"][collection] = {
+            "missing": [name for name in declared if name not in existing],
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_"),
+            "undeclared": sorted(name for name in existing if name not in declared and name != "_id_"),
+            "usage": usage,
+        }
+
+    for collection, query, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        report["queries"].append({
+            "collection": collection,
+            "filter": query,
+            "sort": dict(sort),
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+        })
+
+    return report
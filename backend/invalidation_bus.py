@@ -0,0 +1,131 @@
+"""
+Cross-worker cache invalidation over a local Unix socket, for deployments where MongoDB
+change streams are not available (standalone server)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional, Set
+
+from cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBroker:
+    """
+    Relays every line a worker sends to every other connected worker.
+
+    Runs in the launcher process (see launcher.py), on its own thread and event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._clients: Set[asyncio.StreamWriter] = set()
+
+    async def serve(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._client, self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"Invalidation bus listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            async for line in reader:
+                for other in self._clients:
+                    if other is not writer:
+                        other.write(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def start_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="invalidation-bus", daemon=True)
+        thread.start()
+        return thread
+
+
+class InvalidationBus:
+    """
+    Publishes the invalidations of this worker's response cache to the broker and applies
+    the ones published by the other workers.
+
+    Invalidations received from the bus are not published again. After losing the broker
+    connection the whole cache is dropped, since messages may have been missed meanwhile.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache: ResponseCache,
+        reconnect_seconds: float = 1.0,
+        should_publish: Optional[Callable[[], bool]] = None,
+    ):
+        self.path = path
+        self.cache = cache
+        self.reconnect_seconds = reconnect_seconds
+        # Lets the caller stop publishing while every worker already sees every change
+        self.should_publish = should_publish
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._receiving = False
+        self._task: Optional[asyncio.Task] = None
+        cache.add_listener(self._publish)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _publish(self, namespace: Optional[str]) -> None:
+        if self._receiving or self._writer is None:
+            return
+        if self.should_publish is not None and not self.should_publish():
+            return
+        self._writer.write(json.dumps({"namespace": namespace}).encode() + b"\n")
+
+    def _apply(self, namespace: Optional[str]) -> None:
+        self._receiving = True
+        try:
+            self.cache.invalidate(namespace)
+        finally:
+            self._receiving = False
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                logger.warning(f"Invalidation bus unavailable, retrying: {e}")
+                await asyncio.sleep(self.reconnect_seconds)
+                continue
+            if connected_before:
+                self._apply(None)
+            connected_before = True
+            self._writer = writer
+            try:
+                async for line in reader:
+                    self._apply(json.loads(line)["namespace"])
+                logger.warning("Invalidation bus closed the connection")
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"Invalidation bus connection lost: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(self.reconnect_seconds)
@@ -0,0 +1,181 @@
+"""
+In-process job queue persisted in a Mongo outbox, for side effects run off the request path
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import PyMongoError
+
+from metrics import JOBS_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Jobs are written to the outbox collection when enqueued and claimed by a fixed number
+    of worker tasks, so pending work survives restarts and concurrency stays bounded.
+
+    A failed job is retried with exponential backoff and jitter until max_attempts, then
+    left in the "failed" state. A claim expires after lock_seconds: a job whose worker died
+    mid-run is picked up again by any process.
+    """
+
+    def __init__(
+        self,
+        collection,
+        workers: int = 4,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 300.0,
+        poll_interval: float = 5.0,
+        lock_seconds: float = 60.0,
+    ):
+        self.collection = collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_interval = poll_interval
+        self.lock_seconds = lock_seconds
+        self._handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def enqueue(self, kind: str, payload: dict) -> None:
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "state": "pending",
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+        })
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue_once(self, key: str, kind: str, payload: dict) -> bool:
+        """Enqueue a job unless one with this key was already enqueued; True when it was added"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": key},
+            {"$setOnInsert": {
+                "kind": kind,
+                "payload": payload,
+                "state": "pending",
+                "attempts": 0,
+                "run_at": now,
+                "created_at": now,
+            }},
+            upsert=True,
+        )
+        if result.upserted_id is None:
+            return False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self) -> None:
+        # On Python < 3.12, wait_for() loses a cancellation arriving just as the wakeup is set:
+        # the flag makes sure the workers exit anyway
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"state": "pending", "run_at": {"$lte": now}},
+                {"state": "running", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {"state": "running", "locked_until": now + timedelta(seconds=self.lock_seconds)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self, number: int) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except PyMongoError as e:
+                logger.warning(f"Job worker {number} could not poll the outbox: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run(job)
+            except PyMongoError as e:
+                # The outcome was not recorded: the claim expires after lock_seconds and the job runs again
+                logger.warning(f"Job worker {number} could not record the outcome of job {job['_id']}: {e}")
+
+    async def run(self, job: dict) -> None:
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for {job['kind']!r}")
+            await handler(job["payload"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= self.max_attempts or handler is None:
+                logger.error(f"Job {job['_id']} ({job['kind']}) failed for good after {job['attempts']} attempts: {error}")
+                update = {"state": "failed", "last_error": error, "finished_at": datetime.utcnow()}
+                JOBS_PROCESSED.inc(job["kind"], "failed")
+            else:
+                delay = self.backoff(job["attempts"])
+                logger.warning(f"Job {job['_id']} ({job['kind']}) attempt {job['attempts']} failed, retrying in {delay:.1f}s: {error}")
+                update = {"state": "pending", "last_error": error, "run_at": datetime.utcnow() + timedelta(seconds=delay)}
+                JOBS_PROCESSED.inc(job["kind"], "retried")
+                if self._wakeup is not None:
+                    # Wake a worker when the retry is due rather than at the next poll
+                    asyncio.get_running_loop().call_later(delay, self._wakeup.set)
+        else:
+            update = {"state": "done", "finished_at": datetime.utcnow()}
+            JOBS_PROCESSED.inc(job["kind"], "done")
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        async for group in self.collection.aggregate([{"$group": {"_id": "$state", "count": {"$sum": 1}}}]):
+            counts[group["_id"]] = group["count"]
+        return counts
+
+    async def requeue_failed(self) -> int:
+        """Give failed jobs a fresh set of attempts"""
+        result = await self.collection.update_many(
+            {"state": "failed"},
+            {"$set": {"state": "pending", "attempts": 0, "run_at": datetime.utcnow()}, "$unset": {"finished_at": ""}},
+        )
+        return result.modified_count
@@ -0,0 +1,85 @@
+"""
+Multi-worker entry point: one uvicorn worker per available core, a Mongo connection budget
+split between them and a local bus keeping their response caches coherent
+
+Usage: python launcher.py [--host 0.0.0.0] [--port 8001] [--workers N]
+"""
+import argparse
+import logging
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import uvicorn
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("launcher")
+
+
+def cgroup_cpu_limit():
+    """CPU quota of the container, or None when unlimited"""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()  # cgroup v2
+    except (OSError, ValueError):
+        try:
+            quota = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text().strip()  # cgroup v1
+            period = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Majestea API with several worker processes")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "0")),
+                        help="Worker processes, one per available core by default")
+    args = parser.parse_args()
+
+    workers = args.workers or available_cpus()
+    # Read by settings.py in every worker to size its share of MONGO_CONNECTION_BUDGET
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    if workers > 1 and not os.environ.get("INVALIDATION_BUS_SOCKET"):
+        os.environ["INVALIDATION_BUS_SOCKET"] = os.path.join(tempfile.gettempdir(), f"majestea-bus-{os.getpid()}.sock")
+
+    import settings
+    from invalidation_bus import InvalidationBroker
+
+    logger.info(
+        f"Starting {workers} workers, up to {settings.MONGO_MAX_POOL_SIZE} MongoDB connections each"
+        + (f" (budget {settings.MONGO_CONNECTION_BUDGET})" if settings.MONGO_CONNECTION_BUDGET else "")
+    )
+    if workers > 1 and settings.RATE_LIMIT_BACKEND == "memory":
+        logger.warning("RATE_LIMIT_BACKEND=memory: each worker enforces the rate limits separately")
+    if settings.INVALIDATION_BUS_SOCKET:
+        InvalidationBroker(settings.INVALIDATION_BUS_SOCKET).start_thread()
+
+    try:
+        uvicorn.run(
+            "server:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            proxy_headers=True,
+            forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        )
+    finally:
+        if settings.INVALIDATION_BUS_SOCKET and os.path.exists(settings.INVALIDATION_BUS_SOCKET):
+            os.unlink(settings.INVALIDATION_BUS_SOCKET)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Per-client rate limiting (token buckets) and per-route-class concurrency limits
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from starlette.exceptions import HTTPException
+
+from metrics import REQUESTS_REJECTED
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimit(NamedTuple):
+    method: str
+    path: str
+    rate: float  # tokens refilled per second
+    burst: int  # bucket size
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and path.rstrip("/") == self.path
+
+
+class MemoryRateLimitBackend:
+    """Buckets held by this process; with several workers each enforces its own share"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token; returns 0 when allowed, otherwise the seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoRateLimitBackend:
+    """
+    Buckets shared by every worker and instance, one document per key updated atomically
+    with an aggregation pipeline evaluated against the server clock ($$NOW).
+
+    Documents carry an expires_at for a TTL index. When Mongo is unavailable requests are let
+    through: the limiter must not turn a database hiccup into an outage.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled, "updated": "$$NOW"}},
+                    {"$set": {
+                        "allowed": {"$gte": ["$tokens", 1]},
+                        "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        "expires_at": {"$add": ["$$NOW", int(math.ceil(burst / rate)) * 1000]},
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            logger.warning(f"Shared rate limiter unavailable, allowing request: {e}")
+            return 0.0
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / rate
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Concurrency class of a request; probes and metrics are never shed"""
+    if path in ("/api/health", "/api/health/live", "/api/health/ready", "/api/metrics"):
+        return None
+    if path.endswith("/export") or path.startswith("/api/admin"):
+        return "admin"
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    return "read"
+
+
+def _reject(status_code: int, retry_after: Optional[float], detail: str):
+    headers = [(b"content-type", b"application/json")]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode()))
+    return [
+        {"type": "http.response.start", "status": status_code, "headers": headers},
+        {"type": "http.response.body", "body": dumps({"detail": detail})},
+    ]
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware rejecting requests before they reach the application.
+
+    Requests matching a RateLimit rule take a token from the bucket of (rule, client IP) and
+    get 429 when it is empty. Every request also counts against the concurrency limit of its
+    route class; past the limit it is shed with 503 instead of queueing on the event loop
+    and the connection pool. Both carry Retry-After.
+    """
+
+    def __init__(self, app, rules: List[RateLimit], backend, concurrency: Dict[str, int]):
+        self.app = app
+        self.rules = rules
+        self.backend = backend
+        self.concurrency = concurrency
+        self.in_flight: Dict[str, int] = {name: 0 for name in concurrency}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        # Behind a proxy, run uvicorn with --proxy-headers so this is the real client address
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+
+        for rule in self.rules:
+            if rule.matches(method, path):
+                retry_after = await self.backend.take(f"{rule.method} {rule.path} {client_ip}", rule.rate, rule.burst)
+                if retry_after:
+                    REQUESTS_REJECTED.inc("rate_limited", rule.path)
+                    for message in _reject(429, retry_after, "Trop de requêtes, merci de réessayer dans quelques instants."):
+                        await send(message)
+                    return
+                break
+
+        name = route_class(method, path)
+        limit = self.concurrency.get(name)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight[name] >= limit:
+            REQUESTS_REJECTED.inc("overloaded", name)
+            for message in _reject(503, 1, "Service momentanément surchargé, merci de réessayer."):
+                await send(message)
+            return
+        self.in_flight[name] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[name] -= 1
+
+
+def too_large_detail(limit: int) -> str:
+    return f"Requête trop volumineuse (maximum {limit / (1024 * 1024):.0f} Mo)."
+
+
+class BodySizeLimitMiddleware:
+    """
+    Refuses request bodies over the size limit of their path with 413 before they are read
+    whole: right away from Content-Length, otherwise (chunked uploads) as soon as the body
+    streamed in so far exceeds it.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"].rstrip("/")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            REQUESTS_REJECTED.inc("too_large", scope["path"])
+            for message in _reject(413, None, too_large_detail(limit)):
+                await send(message)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    REQUESTS_REJECTED.inc("too_large", scope["path"])
+                    # Raised inside the application, which answers it like any HTTPException
+                    raise HTTPException(status_code=413, detail=too_large_detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,138 @@
+"""
+Maintenance commands for the Majestea backend
+
+Usage: python manage.py <command>
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import httpx
+import typer
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import settings
+
+from indexes import ensure_indexes, index_report
+from availability import AvailabilityService, capacity_from_env
+from seed_data import RESTAURANT_INFO
+from review_stats import rebuild_review_stats
+from jobs import JobQueue
+from images import ImagePipeline
+from archive import CollectionArchive, FileArchive, ReservationArchiver
+
+cli = typer.Typer(help="Majestea backend maintenance commands")
+
+
+def run(command):
+    """Run an async command against the configured database"""
+    async def main():
+        client = AsyncIOMotorClient(settings.MONGO_URL, **settings.mongo_client_options())
+        try:
+            return await command(client[settings.DB_NAME])
+        finally:
+            client.close()
+
+    return asyncio.run(main())
+
+
+@cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create any missing index from the registry"""
+    created = run(ensure_indexes)
+    typer.echo(json.dumps(created, indent=2))
+
+
+@cli.command("index-report")
+def index_report_command():
+    """Print missing/unused indexes and the winning plan of each known query"""
+    report = run(index_report)
+    typer.echo(json.dumps(report, indent=2, default=str))
+
+
+@cli.command("rebuild-availability")
+def rebuild_availability_command():
+    """Recompute the per-slot occupancy counters from active reservations"""
+    async def rebuild(db):
+        service = AvailabilityService(
+            db.slot_occupancy,
+            RESTAURANT_INFO["hours"],
+            capacity_from_env(os.environ),
+            slot_minutes=settings.AVAILABILITY_SLOT_MINUTES,
+        )
+        return await service.rebuild(db.reservations)
+
+    typer.echo(f"{run(rebuild)} reservations counted")
+
+
+@cli.command("rebuild-review-stats")
+def rebuild_review_stats_command():
+    """Recompute the review aggregate document from every review"""
+    document = run(lambda db: rebuild_review_stats(db.reviews, db.review_stats))
+    typer.echo(json.dumps(document, indent=2))
+
+
+@cli.command("requeue-failed-jobs")
+def requeue_failed_jobs_command():
+    """Retry the outbox jobs that ran out of attempts"""
+    count = run(lambda db: JobQueue(db.outbox).requeue_failed())
+    typer.echo(f"{count} jobs requeued")
+
+
+@cli.command("localize-gallery")
+def localize_gallery_command():
+    """Download hotlinked gallery images and serve them as local responsive variants"""
+    async def localize(db):
+        pipeline = ImagePipeline(
+            Path(settings.MEDIA_DIR) / "gallery",
+            settings.GALLERY_ORIGINALS_DIR,
+            url_prefix=f"{settings.MEDIA_URL}/gallery",
+            widths=settings.GALLERY_VARIANT_WIDTHS,
+            formats=settings.GALLERY_VARIANT_FORMATS,
+            quality=settings.GALLERY_VARIANT_QUALITY,
+            max_pixels=settings.GALLERY_MAX_PIXELS,
+            workers=settings.GALLERY_IMAGE_WORKERS,
+        )
+        count = 0
+        try:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=30) as http:
+                async for image in db.gallery.find({"src": {"$regex": "^https?://"}}):
+                    response = await http.get(image["src"])
+                    response.raise_for_status()
+                    rendered = await pipeline.process(response.content)
+                    await db.gallery.update_one({"_id": image["_id"]}, {"$set": rendered})
+                    typer.echo(f"{image['id']}: {rendered['src']}")
+                    count += 1
+        finally:
+            pipeline.stop()
+        return count
+
+    typer.echo(f"{run(localize)} images localized")
+
+
+@cli.command("archive-reservations")
+def archive_reservations_command(
+    after_days: int = typer.Option(settings.RESERVATION_ARCHIVE_AFTER_DAYS, help="Archive visits older than this"),
+):
+    """Move past reservations to the archive now, rather than at the next scheduled run"""
+    if after_days <= 0:
+        typer.echo("Archival is disabled (after days <= 0): nothing archived", err=True)
+        raise typer.Exit(1)
+
+    async def archive(db):
+        if settings.RESERVATION_ARCHIVE_BACKEND == "files":
+            store = FileArchive(settings.RESERVATION_ARCHIVE_DIR)
+        else:
+            store = CollectionArchive(db.reservations_archive)
+        archiver = ReservationArchiver(
+            db.reservations, store, JobQueue(db.outbox),
+            after_days=after_days, batch_size=settings.RESERVATION_ARCHIVE_BATCH_SIZE,
+        )
+        return await archiver.archive()
+
+    typer.echo(f"{run(archive)} reservations archived")
+
+
+if __name__ == "__main__":
+    cli()
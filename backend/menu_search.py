@@ -0,0 +1,185 @@
+"""
+In-memory menu search: accent-insensitive inverted index over item names and descriptions
+plus a sorted price index
+"""
+import bisect
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ligatures NFKD leaves alone
+LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Weight of a query token found in the item name, relative to the description
+NAME_WEIGHT = 2
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: "Bœuf crème brûlée" -> "boeuf creme brulee" """
+    decomposed = unicodedata.normalize("NFKD", text.translate(LIGATURES))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(fold(text) if isinstance(text, str) else "")
+
+
+class MenuIndex:
+    """
+    Search structures for the menu items of every category.
+
+    Whole-word postings live in a dict and a sorted vocabulary serves prefix lookups for
+    the last, possibly incomplete, query word. Item updates only touch their own postings.
+    """
+
+    def __init__(self):
+        self.items: Dict[str, dict] = {}
+        self.categories: Dict[str, str] = {}
+        # Menu version the index reflects, see menu_version.py
+        self.version: Optional[int] = None
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._prices: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def build(self, categories: Iterable[dict], version: Optional[int] = None) -> None:
+        self.version = version
+        self.items, self.categories = {}, {}
+        self._postings, self._prices = defaultdict(dict), []
+        for category in categories:
+            self.categories[category["id"]] = category.get("name", category["id"])
+            for item in category.get("items", []):
+                self._add(item, category["id"])
+        self._vocabulary = sorted(self._postings)
+        self._prices.sort()
+        logger.info(f"Menu search index built: {len(self.items)} items, {len(self._vocabulary)} terms, version {version}")
+
+    def _add(self, item: dict, category_id: str) -> Optional[Set[str]]:
+        """
+        Index an item; the vocabulary and price list are left for the caller to keep sorted.
+        An item stored without an id or a numeric price is skipped (None) rather than failing the index.
+        """
+        try:
+            item_id, price = item["id"], float(item.get("price", 0))
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Menu item not indexed, invalid document in category {category_id}: {item!r}")
+            return None
+        item = dict(item, category_id=category_id)
+        self.items[item_id] = item
+        description, name = tokenize(item.get("description", "")), tokenize(item.get("name", ""))
+        for token in description:
+            self._postings[token].setdefault(item["id"], 1)
+        for token in name:
+            self._postings[token][item["id"]] = NAME_WEIGHT
+        self._prices.append((price, item["id"]))
+        return set(description) | set(name)
+
+    def upsert_item(self, item: dict, category_id: str) -> None:
+        self.remove_item(item["id"])
+        tokens = self._add(item, category_id)
+        if tokens is None:
+            return
+        for token in tokens:
+            position = bisect.bisect_left(self._vocabulary, token)
+            if position == len(self._vocabulary) or self._vocabulary[position] != token:
+                self._vocabulary.insert(position, token)
+        bisect.insort(self._prices, self._prices.pop())
+
+    def remove_item(self, item_id: str) -> None:
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return
+        for token in set(tokenize(item.get("name", "")) + tokenize(item.get("description", ""))):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(item_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+        self._prices.remove((float(item.get("price", 0)), item_id))
+
+    def set_category(self, category_id: str, name: str) -> None:
+        self.categories[category_id] = name
+
+    def remove_category(self, category_id: str) -> None:
+        for item_id in [i for i, item in self.items.items() if item["category_id"] == category_id]:
+            self.remove_item(item_id)
+        self.categories.pop(category_id, None)
+
+    def _matches(self, token: str, prefix: bool) -> Dict[str, int]:
+        if not prefix:
+            return self._postings.get(token, {})
+        scores: Dict[str, int] = {}
+        position = bisect.bisect_left(self._vocabulary, token)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(token):
+            for item_id, weight in self._postings[self._vocabulary[position]].items():
+                scores[item_id] = max(scores.get(item_id, 0), weight)
+            position += 1
+        return scores
+
+    def _price_range(self, min_price: Optional[float], max_price: Optional[float]) -> Set[str]:
+        low = 0 if min_price is None else bisect.bisect_left(self._prices, (min_price, ""))
+        high = len(self._prices) if max_price is None else bisect.bisect_right(self._prices, (max_price, "\uffff"))
+        return {item_id for _, item_id in self._prices[low:high]}
+
+    def search(
+        self,
+        q: str = "",
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        category: Optional[str] = None,
+        limit: int = 50,
+    ) -> dict:
+        """
+        Items matching every word of q (the last one as a prefix), within the price range
+        and category. Name matches rank first, then cheaper items.
+        """
+        scores: Optional[Dict[str, int]] = None
+        tokens = tokenize(q)
+        for position, token in enumerate(tokens):
+            matches = self._matches(token, prefix=position == len(tokens) - 1)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {item_id: score + matches[item_id] for item_id, score in scores.items() if item_id in matches}
+            if not scores:
+                break
+        if scores is None:
+            scores = dict.fromkeys(self.items, 0)
+
+        if min_price is not None or max_price is not None:
+            in_range = self._price_range(min_price, max_price)
+            scores = {item_id: score for item_id, score in scores.items() if item_id in in_range}
+
+        # Category facet counts ignore the category filter itself
+        facets: Dict[str, int] = {}
+        for item_id in scores:
+            category_id = self.items[item_id]["category_id"]
+            facets[category_id] = facets.get(category_id, 0) + 1
+        if category:
+            scores = {i: s for i, s in scores.items() if self.items[i]["category_id"] == category}
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], self.items[i].get("price", 0), self.items[i].get("name", "")))
+        prices = [self.items[i].get("price", 0) for i in scores]
+        return {
+            "count": len(ranked),
+            "items": [self.items[item_id] for item_id in ranked[:limit]],
+            "facets": {
+                "categories": [
+                    {"id": category_id, "name": self.categories.get(category_id, category_id), "count": count}
+                    for category_id, count in sorted(facets.items(), key=lambda f: -f[1])
+                ],
+                "price": {"min": min(prices), "max": max(prices)} if prices else None,
+            },
+        }
@@ -0,0 +1,22 @@
+"""
+Monotonic menu version, bumped on every menu write so clients and caches can compare versions
+"""
+from pymongo import ReturnDocument
+
+VERSION_ID = "menu"
+
+
+async def bump_menu_version(versions) -> int:
+    document = await versions.find_one_and_update(
+        {"_id": VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["version"]
+
+
+async def read_menu_version(versions) -> int:
+    """0 until the first write through the API"""
+    document = await versions.find_one({"_id": VERSION_ID})
+    return document["version"] if document else 0
@@ -0,0 +1,315 @@
+"""
+Request and MongoDB instrumentation exposed in the Prometheus text format
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observed from the event loop and from the driver's executor threads
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        values = self.values().items()
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # One slot per bucket, then sum and count
+                counts = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            values = [(k, list(v)) for k, v in self._values.items()]
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {counts[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Callback run before each scrape, typically to refresh gauges from another component"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",),
+))
+RESPONSE_SIZE = REGISTRY.register(Histogram(
+    "http_response_size_bytes", "HTTP response body size by route", ("method", "route"), buckets=SIZE_BUCKETS,
+))
+MONGO_COMMAND_DURATION = REGISTRY.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command"),
+))
+MONGO_COMMAND_FAILURES = REGISTRY.register(Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("collection", "command"),
+))
+RESPONSE_CACHE_ENTRIES = REGISTRY.register(Gauge(
+    "response_cache_entries", "Entries held by the catalog response cache",
+))
+RESPONSE_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "response_cache_lookups_total", "Catalog response cache lookups (hit, miss)", ("result",),
+))
+MONGO_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "mongodb_pool_connections", "Open connections per server", ("address",),
+))
+MONGO_POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "mongodb_pool_checked_out", "Connections currently checked out per server", ("address",),
+))
+MONGO_POOL_CHECKOUT_FAILURES = REGISTRY.register(Counter(
+    "mongodb_pool_checkout_failures_total", "Failed connection checkouts", ("address", "reason"),
+))
+COALESCED_READS = REGISTRY.register(Counter(
+    "coalesced_reads_total", "Reads served by an identical query already in flight", ("namespace",),
+))
+JOBS_PROCESSED = REGISTRY.register(Counter(
+    "jobs_processed_total", "Background job runs by outcome (done, retried, failed)", ("kind", "result"),
+))
+REQUESTS_REJECTED = REGISTRY.register(Counter(
+    "http_requests_rejected_total", "Requests refused by rate limits or load shedding", ("reason", "scope"),
+))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, in-flight requests and response sizes per route template.
+
+    Requests slower than slow_request_ms are logged for a sample_rate fraction of them.
+    """
+
+    def __init__(self, app, slow_request_ms: float = 500.0, sample_rate: float = 1.0):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec(method)
+            # FastAPI stores the matched route in the scope during routing
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            REQUEST_DURATION.observe(duration, method, template, str(status_code))
+            RESPONSE_SIZE.observe(size, method, template)
+            if duration * 1000 >= self.slow_request_ms and random.random() < self.sample_rate:
+                query = scope.get("query_string", b"").decode("latin-1")
+                logger.warning(
+                    f"Slow request: {method} {scope['path']}{'?' + query if query else ''} "
+                    f"route={template} status={status_code} bytes={size} duration_ms={duration * 1000:.1f}"
+                )
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every driver command, labelled by collection and command name"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, object], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event) -> str:
+        with self._lock:
+            return self._pending.pop((event.request_id, event.connection_id), "")
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, collection, event.command_name)
+        MONGO_COMMAND_FAILURES.inc(collection, event.command_name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Tracks open and checked out connections of every server pool"""
+
+    def stats(self) -> Dict[str, dict]:
+        open_connections = MONGO_POOL_CONNECTIONS.values()
+        checked_out = MONGO_POOL_CHECKED_OUT.values()
+        return {
+            address: {
+                "open": int(open_connections.get((address,), 0)),
+                "checked_out": int(checked_out.get((address,), 0)),
+            }
+            for (address,) in open_connections.keys() | checked_out.keys()
+        }
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc(self._address(event))
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec(self._address(event))
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.inc(self._address(event))
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec(self._address(event))
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc(self._address(event), str(event.reason))
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CHECKED_OUT.set(self._address(event), value=0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        MONGO_POOL_CONNECTIONS.set(self._address(event), value=0)
+        MONGO_POOL_CHECKED_OUT.set(self._address(event), value=0)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
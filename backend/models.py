@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import List, Optional
 from datetime import datetime
 import uuid
@@ -52,6 +52,25 @@ class MenuItemCreate(BaseModel):
     category_id: str
 
 
+class MenuCategoryUpdate(BaseModel):
+    name: str
+
+
+class MenuItemUpdate(BaseModel):
+    """Fields left out are kept as they are; every field of an item is required, so null is refused"""
+    name: Optional[str] = None
+    price: Optional[float] = None
+    description: Optional[str] = None
+    category_id: Optional[str] = None
+
+    @field_validator("name", "price", "description", "category_id", mode="before")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("ne peut pas être null")
+        return value
+
+
 # ============== Reservation Models ==============
 
 class ReservationBase(BaseModel):
@@ -98,11 +117,22 @@ class ReviewCreate(BaseModel):
 
 # ============== Gallery Models ==============
 
+class GalleryImageSource(BaseModel):
+    type: str
+    srcset: str
+
+
 class GalleryImage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     src: str
     alt: str
     category: str
+    # Set on uploaded images, see images.py
+    srcset: Optional[str] = None
+    sources: Optional[List[GalleryImageSource]] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    placeholder: Optional[str] = None
 
 
 class GalleryImageCreate(BaseModel):
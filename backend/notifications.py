@@ -0,0 +1,77 @@
+"""
+Reservation notifications sent from the job queue, through a pluggable transport
+"""
+import logging
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_LABELS = {
+    "pending": "en attente de confirmation",
+    "confirmed": "confirmée",
+    "cancelled": "annulée",
+}
+
+
+class Message(NamedTuple):
+    to: str
+    subject: str
+    body: str
+
+
+class StubTransport:
+    """Logs messages and keeps them in memory instead of sending them; for development and tests"""
+
+    def __init__(self):
+        self.sent: List[Message] = []
+
+    async def send(self, message: Message) -> None:
+        self.sent.append(message)
+        logger.info(f"[notification] to={message.to} subject={message.subject!r}")
+
+
+TRANSPORTS = {
+    "stub": StubTransport,
+}
+
+
+def transport_from_name(name: str):
+    try:
+        return TRANSPORTS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown NOTIFICATION_TRANSPORT: {name!r}")
+
+
+def recipient(reservation: dict) -> Optional[str]:
+    return reservation.get("email") or reservation.get("phone")
+
+
+def reservation_message(reservation: dict, status: str) -> Message:
+    label = STATUS_LABELS.get(status, status)
+    return Message(
+        to=recipient(reservation),
+        subject=f"Majestea - réservation {label}",
+        body=(
+            f"Bonjour {reservation.get('name', '')},\n\n"
+            f"Votre réservation du {reservation.get('date')} à {reservation.get('time')} "
+            f"pour {reservation.get('guests')} personne(s) est {label}.\n\n"
+            "À bientôt chez Majestea !"
+        ),
+    )
+
+
+class ReservationNotifier:
+    """Job handlers for the reservation lifecycle"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def reservation_created(self, payload: dict) -> None:
+        reservation = payload["reservation"]
+        if recipient(reservation):
+            await self.transport.send(reservation_message(reservation, "pending"))
+
+    async def reservation_status_changed(self, payload: dict) -> None:
+        reservation = payload["reservation"]
+        if recipient(reservation):
+            await self.transport.send(reservation_message(reservation, payload["status"]))
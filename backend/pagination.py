@@ -0,0 +1,33 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created_at: datetime, doc_id: str) -> str:
+    """Opaque cursor pointing just after the given (created_at, id) position"""
+    raw = json.dumps([created_at.isoformat(), doc_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor, raises ValueError on malformed input"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_filter(created_at: datetime, doc_id: str, field: str = "created_at") -> dict:
+    """Documents strictly after the cursor position in (field desc, id desc) order"""
+    return {
+        "$or": [
+            {field: {"$lt": created_at}},
+            {field: created_at, "id": {"$lt": doc_id}},
+        ]
+    }
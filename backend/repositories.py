@@ -0,0 +1,377 @@
+"""
+Data access for each aggregate (restaurant, menu, reservations, reviews, gallery)
+
+Route handlers get their repository through the FastAPI dependencies at the bottom of this
+module and never touch collections themselves: projections, read preferences, batch sizes,
+pagination and cache invalidation live here.
+"""
+import asyncio
+import heapq
+import logging
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from fastapi import Request
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from cache import ResponseCache
+from exports import export_projection
+from menu_version import bump_menu_version, read_menu_version
+from pagination import decode_cursor, encode_cursor, keyset_filter
+from review_stats import read_review_stats, record_review
+
+logger = logging.getLogger(__name__)
+
+# Public documents never expose Mongo's _id
+PUBLIC = {"_id": 0}
+
+NEWEST_FIRST = [("created_at", -1), ("id", -1)]
+OLDEST_FIRST = [("created_at", 1), ("id", 1)]
+
+# Upper bound of the small catalog lists loaded whole
+MAX_CATEGORIES = 100
+MAX_GALLERY_IMAGES = 100
+
+
+class Page(NamedTuple):
+    items: List[dict]
+    next_cursor: Optional[str]
+
+
+def _sort_key(document: dict):
+    return document["created_at"], document["id"]
+
+
+async def _merge_oldest_first(cursors, drop: Sequence[str] = ()) -> AsyncIterator[dict]:
+    """Documents of several cursors sorted oldest first, as one sorted stream, minus the drop fields"""
+    heads = []
+    for index, cursor in enumerate(cursors):
+        async for document in cursor:
+            heads.append((_sort_key(document), index, document))
+            break
+    heapq.heapify(heads)
+    while heads:
+        _, index, document = heapq.heappop(heads)
+        for field in drop:
+            document.pop(field, None)
+        yield document
+        async for following in cursors[index]:
+            heapq.heappush(heads, (_sort_key(following), index, following))
+            break
+
+
+def without_id(document: dict) -> dict:
+    """Copy of a document as inserted, minus the _id the driver added to it"""
+    return {key: value for key, value in document.items() if key != "_id"}
+
+
+class Repository:
+    """
+    Base for the aggregate repositories.
+
+    Writes go to db (the primary); catalog reads go to catalog_db, which may be served by
+    secondaries. Writes to a cached aggregate invalidate its cache namespace.
+    """
+
+    namespace: Optional[str] = None
+
+    def __init__(self, db, catalog_db=None, cache: Optional[ResponseCache] = None):
+        self.db = db
+        self.catalog_db = db if catalog_db is None else catalog_db
+        self.cache = cache
+
+    def invalidate(self) -> None:
+        if self.cache is not None and self.namespace is not None:
+            self.cache.invalidate(self.namespace)
+
+    async def _page(self, collections: Sequence, query: dict, projection: dict, limit: int, cursor: Optional[str]) -> Page:
+        """
+        One page newest first with keyset pagination, across one or more collections;
+        raises ValueError on a malformed cursor
+        """
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            query = {**query, **keyset_filter(created_at, last_id)}
+        pages = await asyncio.gather(*(
+            collection.find(query, projection).sort(NEWEST_FIRST).limit(limit + 1).to_list(limit + 1)
+            for collection in collections
+        ))
+        documents = pages[0] if len(pages) == 1 else list(heapq.merge(*pages, key=_sort_key, reverse=True))
+        if len(documents) <= limit:
+            return Page(documents, None)
+        documents = documents[:limit]
+        return Page(documents, encode_cursor(documents[-1]["created_at"], documents[-1]["id"]))
+
+
+class RestaurantRepository(Repository):
+    namespace = "restaurant"
+
+    async def get(self) -> Optional[dict]:
+        return await self.catalog_db.restaurant.find_one({}, PUBLIC)
+
+
+class MenuRepository(Repository):
+    """Categories embed their items; every write bumps the menu version (see menu_version.py)"""
+
+    namespace = "menu"
+
+    async def categories(self, fresh: bool = False) -> List[dict]:
+        """All categories; fresh reads the primary, for derived data that must not lag"""
+        db = self.db if fresh else self.catalog_db
+        return await db.menu_categories.find({}, PUBLIC).to_list(MAX_CATEGORIES)
+
+    async def category(self, category_id: str) -> Optional[dict]:
+        return await self.catalog_db.menu_categories.find_one({"id": category_id}, PUBLIC)
+
+    async def category_exists(self, category_id: str) -> bool:
+        return await self.db.menu_categories.find_one({"id": category_id}, {"_id": 1}) is not None
+
+    async def version(self, fresh: bool = True) -> int:
+        return await read_menu_version((self.db if fresh else self.catalog_db).catalog_versions)
+
+    async def bump_version(self) -> int:
+        return await bump_menu_version(self.db.catalog_versions)
+
+    async def create_category(self, category: dict) -> dict:
+        """Raises DuplicateKeyError when the id is taken"""
+        await self.db.menu_categories.insert_one(category)
+        return without_id(category)
+
+    async def rename_category(self, category_id: str, name: str) -> bool:
+        result = await self.db.menu_categories.update_one({"id": category_id}, {"$set": {"name": name}})
+        return result.matched_count > 0
+
+    async def delete_category(self, category_id: str) -> bool:
+        result = await self.db.menu_categories.delete_one({"id": category_id})
+        return result.deleted_count > 0
+
+    async def add_item(self, item: dict) -> bool:
+        """Append an item to its category; False when the category doesn't exist"""
+        result = await self.db.menu_categories.update_one({"id": item["category_id"]}, {"$push": {"items": item}})
+        return result.matched_count > 0
+
+    @staticmethod
+    def _only_item(item_id: str) -> dict:
+        # $elemMatch rather than the positional items.$ so in-memory stand-ins support it too
+        return {"_id": 0, "id": 1, "items": {"$elemMatch": {"id": item_id}}}
+
+    async def find_item(self, item_id: str) -> Optional[Tuple[str, dict]]:
+        """(category id, item) of an item"""
+        category = await self.db.menu_categories.find_one({"items.id": item_id}, self._only_item(item_id))
+        if not category:
+            return None
+        return category["id"], category["items"][0]
+
+    async def update_item(self, item_id: str, changes: dict) -> Optional[dict]:
+        """Set some fields of an item in place; returns the updated item"""
+        category = await self.db.menu_categories.find_one_and_update(
+            {"items.id": item_id},
+            {"$set": {f"items.$.{field}": value for field, value in changes.items()}},
+            projection=self._only_item(item_id),
+            return_document=ReturnDocument.AFTER,
+        )
+        return category["items"][0] if category else None
+
+    async def move_item(self, item: dict, source_id: str) -> None:
+        """Move an item, already carrying its new category_id, out of source_id"""
+        # Push the updated copy first so the item is never missing from the menu
+        await self.db.menu_categories.update_one({"id": item["category_id"]}, {"$push": {"items": item}})
+        await self.db.menu_categories.update_one({"id": source_id}, {"$pull": {"items": {"id": item["id"]}}})
+
+    async def remove_item(self, item_id: str) -> bool:
+        result = await self.db.menu_categories.update_one({"items.id": item_id}, {"$pull": {"items": {"id": item_id}}})
+        return result.matched_count > 0
+
+
+class ReservationRepository(Repository):
+    """
+    Reservations are private: always read from and written to the primary.
+
+    Reservations archived by archive.py into reservations_archive are only read when asked
+    for with include_archived.
+    """
+
+    @property
+    def archive(self):
+        return self.db.reservations_archive
+
+    async def create(self, reservation: dict) -> dict:
+        """Raises DuplicateKeyError on an active duplicate (see indexes.py)"""
+        await self.db.reservations.insert_one(reservation)
+        return without_id(reservation)
+
+    async def insert_many(self, documents: List[dict]) -> Dict[int, dict]:
+        """Unordered insert; returns the write errors by position in documents"""
+        if not documents:
+            return {}
+        try:
+            await self.db.reservations.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error for error in e.details.get("writeErrors", [])}
+        return {}
+
+    async def get(self, reservation_id: str, include_archived: bool = False) -> Optional[dict]:
+        reservation = await self.db.reservations.find_one({"id": reservation_id}, PUBLIC)
+        if reservation is None and include_archived:
+            reservation = await self.archive.find_one({"id": reservation_id}, PUBLIC)
+        return reservation
+
+    async def page(
+        self,
+        query: dict,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        include_archived: bool = False,
+    ) -> Page:
+        projection = dict(PUBLIC)
+        if fields:
+            # The cursor of the next page needs created_at and id
+            projection.update({field: 1 for field in fields}, id=1, created_at=1)
+        collections = [self.db.reservations, self.archive] if include_archived else [self.db.reservations]
+        return await self._page(collections, query, projection, limit, cursor)
+
+    def export(self, query: dict, columns: List[str], batch_size: int, include_archived: bool = False):
+        """Cursor over every matching reservation, oldest first, fetched batch_size at a time"""
+        if not include_archived:
+            return self.db.reservations.find(query, export_projection(columns)).sort(OLDEST_FIRST).batch_size(batch_size)
+        # created_at and id order the merge even when not exported
+        projection = dict(export_projection(columns), created_at=1, id=1)
+        cursors = [
+            collection.find(query, projection).sort(OLDEST_FIRST).batch_size(batch_size)
+            for collection in (self.db.reservations, self.archive)
+        ]
+        return _merge_oldest_first(cursors, drop=[field for field in ("created_at", "id") if field not in columns])
+
+    async def set_status(self, reservation_id: str, status: str, active: bool, fields: List[str]) -> Optional[dict]:
+        """Change the status; returns the given fields of the reservation as it was before"""
+        return await self.db.reservations.find_one_and_update(
+            {"id": reservation_id},
+            {"$set": {"status": status, "active": active}},
+            projection={"_id": 0, **{field: 1 for field in fields}, "status": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def restore_status(self, reservation_id: str, status: str, previous_status: str) -> None:
+        """Undo set_status() unless the status changed again meanwhile"""
+        await self.db.reservations.update_one(
+            {"id": reservation_id, "status": status},
+            {"$set": {"status": previous_status, "active": False}},
+        )
+
+    async def deactivate_duplicates(self, active_statuses) -> int:
+        """
+        Keep one active reservation per phone, date and time: the one already flagged active,
+        else the newest. The others are flagged inactive, so that the unique index on active
+        reservations can be built and the backfill below doesn't collide with it.
+        """
+        groups = self.db.reservations.aggregate([
+            {"$match": {"status": {"$in": list(active_statuses)}, "active": {"$ne": False}}},
+            # true sorts above a missing flag
+            {"$sort": {"active": -1, "created_at": -1}},
+            {"$group": {
+                "_id": {"phone": "$phone", "date": "$date", "time": "$time"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1},
+            }},
+            {"$match": {"count": {"$gt": 1}}},
+        ])
+        duplicates = [object_id async for group in groups for object_id in group["ids"][1:]]
+        if duplicates:
+            await self.db.reservations.update_many({"_id": {"$in": duplicates}}, {"$set": {"active": False}})
+            logger.warning(f"{len(duplicates)} duplicate reservations flagged inactive")
+        return len(duplicates)
+
+    async def backfill_active(self, active_statuses) -> None:
+        """Set the active flag the duplicate detection index filters on, for older reservations"""
+        await self.deactivate_duplicates(active_statuses)
+        missing = {"active": {"$exists": False}}
+        await self.db.reservations.update_many(dict(missing, status={"$in": list(active_statuses)}), {"$set": {"active": True}})
+        await self.db.reservations.update_many(missing, {"$set": {"active": False}})
+
+
+class ReviewRepository(Repository):
+    namespace = "reviews"
+
+    async def page(self, limit: int, cursor: Optional[str] = None) -> Page:
+        return await self._page([self.catalog_db.reviews], {}, PUBLIC, limit, cursor)
+
+    async def stats(self) -> dict:
+        return await read_review_stats(self.catalog_db.review_stats)
+
+    async def create(self, review: dict) -> dict:
+        await self.db.reviews.insert_one(review)
+        await record_review(self.db.review_stats, review["rating"])
+        self.invalidate()
+        return without_id(review)
+
+    def export(self, query: dict, columns: List[str], batch_size: int):
+        return self.db.reviews.find(query, export_projection(columns)).batch_size(batch_size)
+
+    async def backfill_timestamps(self) -> None:
+        """Give reviews stored before created_at existed their ObjectId insertion time"""
+        async for review in self.db.reviews.find({"created_at": {"$exists": False}}, {"_id": 1}):
+            if isinstance(review["_id"], ObjectId):
+                created_at = review["_id"].generation_time.replace(tzinfo=None)
+                await self.db.reviews.update_one({"_id": review["_id"]}, {"$set": {"created_at": created_at}})
+
+
+class GalleryRepository(Repository):
+    namespace = "gallery"
+
+    async def images(self, category: Optional[str] = None) -> List[dict]:
+        query = {"category": category} if category else {}
+        return await self.catalog_db.gallery.find(query, PUBLIC).to_list(MAX_GALLERY_IMAGES)
+
+    async def add(self, image: dict) -> dict:
+        await self.db.gallery.insert_one(image)
+        self.invalidate()
+        return without_id(image)
+
+
+class Repositories:
+    """One repository per aggregate, over the same database"""
+
+    def __init__(self, db, catalog_db=None, cache: Optional[ResponseCache] = None):
+        self.db = db
+        self.restaurant = RestaurantRepository(db, catalog_db, cache)
+        self.menu = MenuRepository(db, catalog_db, cache)
+        self.reservations = ReservationRepository(db, catalog_db, cache)
+        self.reviews = ReviewRepository(db, catalog_db, cache)
+        self.gallery = GalleryRepository(db, catalog_db, cache)
+
+
+def in_memory_database(name: str = "majestea"):
+    """Database held in memory by mongomock-motor, for tests and benchmarks"""
+    from mongomock_motor import AsyncMongoMockClient  # test dependency, see requirements.txt
+
+    return AsyncMongoMockClient()[name]
+
+
+# ============== FastAPI dependencies ==============
+# The application keeps its Repositories in app.state.repositories; tests may replace it,
+# or override any of these through app.dependency_overrides
+
+def get_repositories(request: Request) -> Repositories:
+    return request.app.state.repositories
+
+
+def restaurant_repository(request: Request) -> RestaurantRepository:
+    return request.app.state.repositories.restaurant
+
+
+def menu_repository(request: Request) -> MenuRepository:
+    return request.app.state.repositories.menu
+
+
+def reservation_repository(request: Request) -> ReservationRepository:
+    return request.app.state.repositories.reservations
+
+
+def review_repository(request: Request) -> ReviewRepository:
+    return request.app.state.repositories.reviews
+
+
+def gallery_repository(request: Request) -> GalleryRepository:
+    return request.app.state.repositories.gallery
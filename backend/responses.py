@@ -0,0 +1,31 @@
+"""
+orjson based JSON rendering shared by the API responses, the response cache and exports
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    """Compact UTF-8 JSON; datetimes are rendered natively in ISO 8601"""
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Default response class of the API.
+
+    Handlers returning documents straight from our own collections build this response
+    themselves, which skips FastAPI's response validation and jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,53 @@
+"""
+Review aggregates (count, rating sum, 1-5 histogram) maintained incrementally
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = "global"
+RATINGS = range(1, 6)
+
+
+async def record_review(stats, rating: int) -> None:
+    """Fold a newly created review into the aggregate document"""
+    await stats.update_one(
+        {"_id": STATS_ID},
+        {"$inc": {"count": 1, "sum": rating, f"histogram.{rating}": 1}},
+        upsert=True,
+    )
+
+
+async def rebuild_review_stats(reviews, stats) -> dict:
+    """Recompute the aggregate document from every review with one aggregation pipeline"""
+    pipeline = [
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": "$count"},
+            "sum": {"$sum": {"$multiply": ["$_id", "$count"]}},
+            "histogram": {"$push": {"rating": "$_id", "count": "$count"}},
+        }},
+    ]
+    result = await reviews.aggregate(pipeline).to_list(1)
+    document = {"count": 0, "sum": 0, "histogram": {}}
+    if result:
+        document = {
+            "count": result[0]["count"],
+            "sum": result[0]["sum"],
+            "histogram": {str(bucket["rating"]): bucket["count"] for bucket in result[0]["histogram"]},
+        }
+    await stats.replace_one({"_id": STATS_ID}, document, upsert=True)
+    logger.info(f"Review stats rebuilt from {document['count']} reviews")
+    return document
+
+
+async def read_review_stats(stats) -> dict:
+    document = await stats.find_one({"_id": STATS_ID}) or {}
+    count = document.get("count", 0)
+    histogram = document.get("histogram", {})
+    return {
+        "count": count,
+        "average": round(document.get("sum", 0) / count, 2) if count else None,
+        "histogram": {str(rating): histogram.get(str(rating), 0) for rating in RATINGS},
+    }
@@ -1,30 +1,193 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, Depends, File, Form, Header, HTTPException, Query, Request, Response, UploadFile, status
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import re
+import json
+import uuid
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
 import logging
+from typing import Any, Awaitable, Callable, List, Optional
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import List
-from datetime import datetime
 
 from models import (
     RestaurantInfo, MenuCategory, MenuItem, MenuItemCreate,
+    MenuCategoryCreate, MenuCategoryUpdate, MenuItemUpdate,
     Reservation, ReservationCreate, Review, ReviewCreate,
     GalleryImage, GalleryImageCreate
 )
 from seed_data import RESTAURANT_INFO, MENU_CATEGORIES, REVIEWS, GALLERY_IMAGES
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from responses import FastJSONResponse, dumps
+from cache import ResponseCache, CacheInvalidator, Payload
+from coalescing import SingleFlight
+from archive import ARCHIVE_JOB, CollectionArchive, FileArchive, ReservationArchiver
+from invalidation_bus import InvalidationBus
+from site_bundle import SiteBundle
+from images import ImagePipeline, ImageError, ImmutableStaticFiles
+from compression import CompressionMiddleware, negotiate_encoding
+from menu_search import MenuIndex
+from pagination import decode_cursor
+from repositories import (
+    Repositories, RestaurantRepository, MenuRepository, ReservationRepository, ReviewRepository,
+    GalleryRepository, restaurant_repository, menu_repository, reservation_repository,
+    review_repository, gallery_repository,
+)
+from idempotency import IdempotencyStore, IdempotencyConflict, fingerprint
+from jobs import JobQueue
+from notifications import ReservationNotifier, transport_from_name
+from limits import RateLimit, RateLimitMiddleware, MemoryRateLimitBackend, MongoRateLimitBackend, BodySizeLimitMiddleware
+from indexes import ensure_indexes, index_report
+from exports import export_columns, export_response
+from review_stats import rebuild_review_stats
+from metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, RESPONSE_CACHE_ENTRIES,
+    MetricsMiddleware, MongoCommandListener, MongoPoolListener,
+)
+import settings
+from availability import AvailabilityService, SlotError, ACTIVE_STATUSES, capacity_from_env, party_size
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+pool_listener = MongoPoolListener()
+client = AsyncIOMotorClient(
+    settings.MONGO_URL,
+    event_listeners=[MongoCommandListener(), pool_listener],
+    **settings.mongo_client_options(),
+)
+db = client[settings.DB_NAME]
+# Catalog reads (restaurant, menu, reviews, gallery) may be served by secondaries;
+# reservations and every write stay on the primary through db
+catalog_db = client.get_database(settings.DB_NAME, read_preference=settings.catalog_read_preference())
+
+# Concurrent identical catalog reads share one query (see coalescing.py)
+single_flight = SingleFlight(settings.COALESCE_NAMESPACES)
+
+# Catalog response cache (restaurant, menu, reviews, gallery)
+response_cache = ResponseCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    ttl=settings.CACHE_TTL_SECONDS,
+    settle_seconds=settings.MONGO_CATALOG_MAX_STALENESS_SECONDS if settings.catalog_reads_may_lag() else 0,
+    flights=single_flight,
+)
+cache_invalidator = CacheInvalidator(db, response_cache, poll_interval=settings.CACHE_POLL_INTERVAL_SECONDS)
+
+# With several workers, invalidations caused by one worker's writes are relayed to the others,
+# unless change streams already deliver every change to each of them
+invalidation_bus = None
+if settings.INVALIDATION_BUS_SOCKET:
+    invalidation_bus = InvalidationBus(
+        settings.INVALIDATION_BUS_SOCKET,
+        response_cache,
+        should_publish=lambda: cache_invalidator.mode != "change_stream",
+    )
+
+# Idempotency-Key records for reservation creation
+idempotency = IdempotencyStore(db.idempotency_keys, lock_seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+
+# Reservation side effects (notifications) run from a durable outbox, off the request path
+job_queue = JobQueue(
+    db.outbox,
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    backoff_seconds=settings.JOB_BACKOFF_SECONDS,
+    max_backoff_seconds=settings.JOB_MAX_BACKOFF_SECONDS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    lock_seconds=settings.JOB_LOCK_SECONDS,
+)
+notifier = ReservationNotifier(transport_from_name(settings.NOTIFICATION_TRANSPORT))
+job_queue.register("reservation_created", notifier.reservation_created)
+job_queue.register("reservation_status_changed", notifier.reservation_status_changed)
+
+# Past reservations leave the hot collection so it and its indexes stay small
+reservation_archiver = ReservationArchiver(
+    db.reservations,
+    FileArchive(settings.RESERVATION_ARCHIVE_DIR)
+    if settings.RESERVATION_ARCHIVE_BACKEND == "files" else CollectionArchive(db.reservations_archive),
+    job_queue,
+    after_days=settings.RESERVATION_ARCHIVE_AFTER_DAYS,
+    batch_size=settings.RESERVATION_ARCHIVE_BATCH_SIZE,
+    interval=settings.RESERVATION_ARCHIVE_INTERVAL_SECONDS,
+)
+job_queue.register(ARCHIVE_JOB, reservation_archiver.run)
+
+# Whole public site in one precompressed document, rebuilt whenever a catalog namespace changes
+site_bundle = SiteBundle(db, top_reviews=settings.SITE_BUNDLE_TOP_REVIEWS, directory=settings.SITE_BUNDLE_DIR or None)
+response_cache.add_listener(site_bundle.mark_stale)
+
+# Uploaded gallery images are resized in a process pool
+image_pipeline = ImagePipeline(
+    Path(settings.MEDIA_DIR) / "gallery",
+    settings.GALLERY_ORIGINALS_DIR,
+    url_prefix=f"{settings.MEDIA_URL}/gallery",
+    widths=settings.GALLERY_VARIANT_WIDTHS,
+    formats=settings.GALLERY_VARIANT_FORMATS,
+    quality=settings.GALLERY_VARIANT_QUALITY,
+    max_pixels=settings.GALLERY_MAX_PIXELS,
+    workers=settings.GALLERY_IMAGE_WORKERS,
+)
+
+# Menu search runs against an in-memory index of every item
+menu_index = MenuIndex()
+
+
+# Rebuilds one at a time, so that a slower one can't install older data over a newer one
+menu_index_lock = asyncio.Lock()
+
+
+async def reload_menu_index(force: bool = False):
+    """
+    Rebuild the search index unless it is at the current menu version already. force
+    rebuilds anyway: another process may have changed the menu without bumping the
+    version yet, so a matching version proves nothing after an invalidation.
+    """
+    try:
+        async with menu_index_lock:
+            menus = app.state.repositories.menu
+            version = await menus.version()
+            if force or version != menu_index.version:
+                menu_index.build(await menus.categories(fresh=True), version)
+            # Otherwise writes from this process were already applied incrementally
+        readiness["menu_index"] = True
+        readiness_errors.pop("menu_index", None)
+    except Exception as e:
+        readiness_errors["menu_index"] = str(e)
+        logger.error(f"Menu search index rebuild failed: {e}")
+
+
+def on_catalog_invalidated(namespace: Optional[str]):
+    if namespace in (None, "menu"):
+        spawn(reload_menu_index(force=True))
+
+
+response_cache.add_listener(on_catalog_invalidated)
+
+
+def collect_cache_metrics():
+    stats = response_cache.stats()
+    RESPONSE_CACHE_ENTRIES.set(value=stats["entries"])
+
+
+REGISTRY.add_collector(collect_cache_metrics)
+
+# Seat capacity per reservation slot
+availability = AvailabilityService(
+    db.slot_occupancy,
+    RESTAURANT_INFO["hours"],
+    capacity_from_env(os.environ),
+    slot_minutes=settings.AVAILABILITY_SLOT_MINUTES,
+)
 
 # Create the main app
-app = FastAPI(title="Majestea API", version="1.0.0")
+app = FastAPI(title="Majestea API", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Data access for the route handlers, see repositories.py
+app.state.repositories = Repositories(db, catalog_db, response_cache)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -39,48 +202,207 @@ logger = logging.getLogger(__name__)
 
 # ============== Database Initialization ==============
 
+# Warm-up steps gating /api/health/ready, with the last error of those not done yet
+readiness = {"database": False, "menu_index": False}
+readiness_errors = {}
+
+
+async def seed_if_empty(collection, documents, seed_id=lambda document: document["id"]):
+    """
+    Insert seed documents into an empty collection; True when it seeded.
+
+    Every worker started by launcher.py may find the collection empty: seed documents are
+    upserted under a fixed _id, so concurrent seeds still write each of them once.
+    """
+    if await collection.find_one({}, {"_id": 1}) is not None:
+        return False
+    try:
+        await collection.bulk_write([
+            UpdateOne(
+                {"_id": seed_id(document)},
+                {"$setOnInsert": {key: value for key, value in document.items() if key != "_id"}},
+                upsert=True,
+            )
+            for document in documents
+        ], ordered=False)
+    except BulkWriteError as e:
+        # Two upserts of the same _id raced: the other one inserted it
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    logger.info(f"{collection.name} seeded")
+    return True
+
+
+async def init_reviews():
+    # Seed reviews get distinct timestamps, listed in seed order, newest first
+    now = datetime.utcnow()
+    seeded = await seed_if_empty(db.reviews, [
+        dict(review, created_at=now - timedelta(seconds=position))
+        for position, review in enumerate(REVIEWS)
+    ])
+    if seeded:
+        await rebuild_review_stats(db.reviews, db.review_stats)
+        return
+    await app.state.repositories.reviews.backfill_timestamps()
+    if not await db.review_stats.find_one({"_id": "global"}):
+        await rebuild_review_stats(db.reviews, db.review_stats)
+
+
 async def init_database():
-    """Initialize database with seed data if empty"""
+    """Seed empty collections and backfill older documents, every collection concurrently"""
+    await asyncio.gather(
+        seed_if_empty(db.restaurant, [RESTAURANT_INFO], seed_id=lambda document: "restaurant"),
+        seed_if_empty(db.menu_categories, MENU_CATEGORIES),
+        init_reviews(),
+        seed_if_empty(db.gallery, GALLERY_IMAGES),
+        app.state.repositories.reservations.backfill_active(ACTIVE_STATUSES),
+    )
+    logger.info("Database initialization complete")
+
+
+async def warm_up():
+    """Initialize the database and in-memory state in the background, retrying until it works"""
+    await prewarm_pool()
+    delay = 1.0
+    while not readiness["database"]:
+        try:
+            await init_database()
+        except Exception as e:
+            readiness_errors["database"] = str(e)
+            logger.error(f"Database initialization failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        else:
+            readiness["database"] = True
+            readiness_errors.pop("database", None)
+    delay = 1.0
+    while True:
+        # An invalidation may have built the index before the menu was seeded, at the same version
+        await reload_menu_index(force=True)
+        if readiness["menu_index"]:
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
     try:
-        # Check if restaurant info exists
-        restaurant = await db.restaurant.find_one()
-        if not restaurant:
-            await db.restaurant.insert_one(RESTAURANT_INFO)
-            logger.info("Restaurant info seeded")
-        
-        # Check if menu exists
-        menu_count = await db.menu_categories.count_documents({})
-        if menu_count == 0:
-            await db.menu_categories.insert_many(MENU_CATEGORIES)
-            logger.info("Menu categories seeded")
-        
-        # Check if reviews exist
-        reviews_count = await db.reviews.count_documents({})
-        if reviews_count == 0:
-            await db.reviews.insert_many(REVIEWS)
-            logger.info("Reviews seeded")
-        
-        # Check if gallery exists
-        gallery_count = await db.gallery.count_documents({})
-        if gallery_count == 0:
-            await db.gallery.insert_many(GALLERY_IMAGES)
-            logger.info("Gallery images seeded")
-            
-        logger.info("Database initialization complete")
+        await site_bundle.build()
     except Exception as e:
-        logger.error(f"Database initialization error: {e}")
+        logger.error(f"Site bundle build failed, retrying on first request: {e}")
+
+
+async def prewarm_pool():
+    """Open MONGO_POOL_PREWARM connections up front with concurrent pings"""
+    if settings.MONGO_POOL_PREWARM <= 0:
+        return
+    results = await asyncio.gather(
+        *(db.command("ping") for _ in range(settings.MONGO_POOL_PREWARM)),
+        return_exceptions=True,
+    )
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        logger.warning(f"Connection pool pre-warm: {len(failures)} of {len(results)} pings failed: {failures[0]}")
+    else:
+        logger.info(f"Connection pool pre-warmed with {len(results)} connections")
+
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+background_tasks = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def bind_database(database, catalog_database=None):
+    """Point the repositories and every service at another database, e.g. an in-memory one for benchmarks"""
+    global db, catalog_db
+    db = database
+    catalog_db = database if catalog_database is None else catalog_database
+    app.state.repositories = Repositories(db, catalog_db, response_cache)
+    cache_invalidator.db = db
+    site_bundle.db = db
+    idempotency.collection = db.idempotency_keys
+    job_queue.collection = db.outbox
+    reservation_archiver.collection = db.reservations
+    if isinstance(reservation_archiver.store, CollectionArchive):
+        reservation_archiver.store.collection = db.reservations_archive
+    availability.collection = db.slot_occupancy
+    if isinstance(rate_limit_backend, MongoRateLimitBackend):
+        rate_limit_backend.collection = db.rate_limits
 
 
 @app.on_event("startup")
 async def startup_event():
-    await init_database()
+    # Nothing here waits on MongoDB: the process accepts connections right away and
+    # /api/health/ready keeps traffic away until warm_up() is done
+    spawn(warm_up())
+    # Index builds can take a while on large collections
+    spawn(ensure_indexes(db))
+    cache_invalidator.start()
+    if invalidation_bus is not None:
+        invalidation_bus.start()
+    job_queue.start()
+    reservation_archiver.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await reservation_archiver.stop()
+    await cache_invalidator.stop()
+    if invalidation_bus is not None:
+        await invalidation_bus.stop()
+    await job_queue.stop()
+    await site_bundle.stop()
+    image_pipeline.stop()
     client.close()
 
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified_since(if_modified_since: str, last_modified: str) -> bool:
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+async def catalog_response(
+    request: Request,
+    namespace: str,
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    not_found: str = None,
+) -> Response:
+    """Serve a cached catalog body with validators, answering 304 when the client copy is current"""
+    cached = await response_cache.get_or_load(namespace, key, loader)
+    if cached is None:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    headers = {
+        "ETag": cached.etag,
+        "Last-Modified": cached.last_modified,
+        "Cache-Control": settings.CATALOG_CACHE_CONTROL,
+    }
+    if_none_match = request.headers.get("if-none-match")
+    headers.update(cached.headers)
+    if if_none_match is not None:
+        if etag_matches(if_none_match, cached.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and not_modified_since(if_modified_since, cached.last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 # ============== Root Endpoint ==============
 
 @api_router.get("/")
@@ -88,157 +410,745 @@ async def root():
     return {"message": "Bienvenue sur l'API Majestea", "version": "1.0.0"}
 
 
+# ============== Site Bundle ==============
+
+@api_router.get("/site-bundle", response_model=dict)
+async def get_site_bundle(request: Request):
+    """Restaurant, menu, gallery and latest reviews in one precompressed document"""
+    await site_bundle.ensure_built()
+    headers = {
+        "ETag": site_bundle.etag,
+        "Last-Modified": site_bundle.last_modified,
+        "Cache-Control": settings.CATALOG_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, site_bundle.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), site_bundle.encodings)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=site_bundle.body(encoding), media_type="application/json", headers=headers)
+
+
 # ============== Restaurant Endpoints ==============
 
 @api_router.get("/restaurant", response_model=dict)
-async def get_restaurant_info():
+async def get_restaurant_info(request: Request, restaurant: RestaurantRepository = Depends(restaurant_repository)):
     """Get restaurant information"""
-    restaurant = await db.restaurant.find_one()
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant info not found")
-    restaurant.pop('_id', None)
-    return restaurant
+    return await catalog_response(request, "restaurant", "", restaurant.get, "Restaurant info not found")
 
 
 # ============== Menu Endpoints ==============
 
 @api_router.get("/menu", response_model=List[dict])
-async def get_menu():
+async def get_menu(request: Request, menus: MenuRepository = Depends(menu_repository)):
     """Get all menu categories with items"""
-    categories = await db.menu_categories.find().to_list(100)
-    for cat in categories:
-        cat.pop('_id', None)
-    return categories
+    async def load():
+        categories, version = await asyncio.gather(menus.categories(), menus.version(fresh=False))
+        return Payload(categories, {"X-Menu-Version": str(version)})
+
+    return await catalog_response(request, "menu", "", load)
+
+
+@api_router.get("/menu/version", response_model=dict)
+async def get_menu_version(menus: MenuRepository = Depends(menu_repository)):
+    """Current menu version, bumped on every menu change"""
+    return {"version": await single_flight.do("menu_version", "", menus.version)}
+
+
+# Declared before /menu/{category_id} so "search" isn't taken for a category id
+@api_router.get("/menu/search", response_model=dict)
+async def search_menu(
+    q: str = "",
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    category: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Accent-insensitive search over dish names and descriptions, with category and price facets"""
+    return FastJSONResponse(menu_index.search(q, min_price, max_price, category, limit))
 
 
 @api_router.get("/menu/{category_id}", response_model=dict)
-async def get_menu_category(category_id: str):
+async def get_menu_category(category_id: str, request: Request, menus: MenuRepository = Depends(menu_repository)):
     """Get a specific menu category"""
-    category = await db.menu_categories.find_one({"id": category_id})
-    if not category:
+    async def load():
+        return await menus.category(category_id)
+
+    return await catalog_response(request, "menu", category_id, load, "Category not found")
+
+
+# ============== Menu Admin Endpoints ==============
+
+async def menu_changed(menus: MenuRepository) -> int:
+    """Bump the menu version and invalidate what is derived from the menu; returns the new version"""
+    version = await menus.bump_version()
+    if menu_index.version == version - 1:
+        # The index was current and the write has been applied to it incrementally
+        menu_index.version = version
+    menus.invalidate()
+    return version
+
+
+@api_router.post("/menu", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def create_menu_category(payload: MenuCategoryCreate, menus: MenuRepository = Depends(menu_repository)):
+    """Create an empty menu category (admin)"""
+    try:
+        category = await menus.create_category({"id": payload.id, "name": payload.name, "items": []})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Category already exists")
+    menu_index.set_category(category["id"], category["name"])
+    version = await menu_changed(menus)
+    return FastJSONResponse(
+        {"success": True, "version": version, "category": category},
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@api_router.post("/menu/items", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def create_menu_item(payload: MenuItemCreate, menus: MenuRepository = Depends(menu_repository)):
+    """Append an item to its category (admin)"""
+    item = MenuItem(**payload.dict()).dict()
+    if not await menus.add_item(item):
         raise HTTPException(status_code=404, detail="Category not found")
-    category.pop('_id', None)
-    return category
+    menu_index.upsert_item(item, item["category_id"])
+    version = await menu_changed(menus)
+    return FastJSONResponse({"success": True, "version": version, "item": item}, status_code=status.HTTP_201_CREATED)
+
+
+@api_router.patch("/menu/items/{item_id}", response_model=dict)
+async def update_menu_item(item_id: str, payload: MenuItemUpdate, menus: MenuRepository = Depends(menu_repository)):
+    """Update some fields of an item in place, or move it to another category (admin)"""
+    changes = payload.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    target = changes.get("category_id")
+
+    current = await menus.find_item(item_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    category_id, item = current
+
+    if target is None or target == category_id:
+        item = await menus.update_item(item_id, changes)
+        if not item:
+            raise HTTPException(status_code=404, detail="Menu item not found")
+    else:
+        if not await menus.category_exists(target):
+            raise HTTPException(status_code=404, detail="Category not found")
+        item = dict(item, **changes)
+        await menus.move_item(item, category_id)
+
+    menu_index.upsert_item(item, item["category_id"])
+    version = await menu_changed(menus)
+    return {"success": True, "version": version, "item": item}
+
+
+@api_router.delete("/menu/items/{item_id}", response_model=dict)
+async def delete_menu_item(item_id: str, menus: MenuRepository = Depends(menu_repository)):
+    """Remove an item from its category (admin)"""
+    if not await menus.remove_item(item_id):
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    menu_index.remove_item(item_id)
+    version = await menu_changed(menus)
+    return {"success": True, "version": version}
+
+
+@api_router.patch("/menu/{category_id}", response_model=dict)
+async def update_menu_category(
+    category_id: str,
+    payload: MenuCategoryUpdate,
+    menus: MenuRepository = Depends(menu_repository),
+):
+    """Rename a category (admin)"""
+    if not await menus.rename_category(category_id, payload.name):
+        raise HTTPException(status_code=404, detail="Category not found")
+    menu_index.set_category(category_id, payload.name)
+    version = await menu_changed(menus)
+    return {"success": True, "version": version}
+
+
+@api_router.delete("/menu/{category_id}", response_model=dict)
+async def delete_menu_category(category_id: str, menus: MenuRepository = Depends(menu_repository)):
+    """Delete a category with all its items (admin)"""
+    if not await menus.delete_category(category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
+    menu_index.remove_category(category_id)
+    version = await menu_changed(menus)
+    return {"success": True, "version": version}
 
 
 # ============== Reservation Endpoints ==============
 
+RESERVATION_STATUSES = ("pending", "confirmed", "cancelled")
+
+
+NOTIFICATION_FIELDS = ("id", "name", "email", "phone", "date", "time", "guests")
+
+
+async def enqueue_job(kind: str, payload: dict) -> None:
+    """Queue a side effect; the write it follows has succeeded, so a failure here is only logged"""
+    try:
+        await job_queue.enqueue(kind, payload)
+    except Exception as e:
+        logger.error(f"Could not enqueue {kind} job: {e}")
+
+
+DUPLICATE_RESERVATION = "Une réservation existe déjà pour ce numéro à cette date et cette heure."
+
+
 @api_router.post("/reservations", response_model=dict, status_code=status.HTTP_201_CREATED)
-async def create_reservation(reservation: ReservationCreate):
-    """Create a new reservation"""
-    import uuid
-    
+async def create_reservation(
+    reservation: ReservationCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
+    """Create a new reservation
+
+    Retries carrying the same Idempotency-Key get the first response back without booking again.
+    """
+    if idempotency_key is None:
+        return await book_reservation(reservation, reservations)
+
+    try:
+        stored = await idempotency.begin("reservations", idempotency_key, fingerprint(reservation.dict()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyConflict as e:
+        if e.in_progress:
+            raise HTTPException(status_code=409, detail=e.detail, headers={"Retry-After": "1"})
+        raise HTTPException(status_code=422, detail=e.detail)
+    if stored is not None:
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    try:
+        response = await book_reservation(reservation, reservations)
+    except HTTPException as e:
+        # Client errors are final and replayed as well; server errors may be retried
+        if e.status_code >= 500:
+            await idempotency.abandon("reservations", idempotency_key)
+        else:
+            await idempotency.complete("reservations", idempotency_key, e.status_code, dumps({"detail": e.detail}))
+        raise
+    except Exception:
+        await idempotency.abandon("reservations", idempotency_key)
+        raise
+    await idempotency.complete("reservations", idempotency_key, response.status_code, response.body)
+    return response
+
+
+async def book_reservation(reservation: ReservationCreate, reservations: ReservationRepository) -> Response:
+    try:
+        slot = availability.slot_for(reservation.date, reservation.time)
+        guests = party_size(reservation.guests)
+    except SlotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await availability.reserve(slot, guests):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ce créneau est complet, merci de choisir un autre horaire.",
+        )
+
     reservation_dict = reservation.dict()
     reservation_dict["id"] = str(uuid.uuid4())
     reservation_dict["status"] = "pending"
     reservation_dict["created_at"] = datetime.utcnow()
+    reservation_dict["active"] = True
     
-    result = await db.reservations.insert_one(reservation_dict)
-    
-    if result.inserted_id:
-        reservation_dict.pop('_id', None)
-        logger.info(f"New reservation created: {reservation_dict['id']}")
-        return {
-            "success": True,
-            "message": "Votre demande de réservation a été envoyée avec succès !",
-            "reservation": reservation_dict
-        }
-    
-    raise HTTPException(status_code=500, detail="Failed to create reservation")
+    try:
+        reservation_dict = await reservations.create(reservation_dict)
+    except DuplicateKeyError:
+        await availability.release(slot, guests)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=DUPLICATE_RESERVATION)
+    except Exception:
+        await availability.release(slot, guests)
+        raise
+
+    logger.info(f"New reservation created: {reservation_dict['id']}")
+    await enqueue_job("reservation_created", {
+        "reservation": {field: reservation_dict.get(field) for field in NOTIFICATION_FIELDS},
+    })
+    return FastJSONResponse({
+        "success": True,
+        "message": "Votre demande de réservation a été envoyée avec succès !",
+        "reservation": reservation_dict
+    }, status_code=status.HTTP_201_CREATED)
+
+
+def reservation_slot(reservation: dict):
+    """(slot, guests) held by a stored reservation, or None for legacy free-text values"""
+    try:
+        return (
+            availability.slot_for(reservation["date"], reservation["time"]),
+            party_size(reservation["guests"]),
+        )
+    except (SlotError, KeyError):
+        return None
+
+
+BULK_CHUNK_SIZE = settings.BULK_CHUNK_SIZE
+
+
+def parse_bulk_rows(body: bytes, content_type: str) -> List[tuple]:
+    """Split a JSON array or NDJSON body into (row, error) pairs"""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        rows = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append((json.loads(line), None))
+            except ValueError as e:
+                rows.append((None, f"Invalid JSON: {e}"))
+        return rows
+
+    try:
+        rows = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of reservations")
+    return [(row, None) for row in rows]
+
+
+async def insert_reservation_chunk(chunk: List[tuple], reservations: ReservationRepository) -> List[dict]:
+    """Insert the valid documents of a chunk unordered and build its per-row results"""
+    documents = [doc for _, doc, _ in chunk if doc is not None]
+    failed = {
+        index: DUPLICATE_RESERVATION if error.get("code") == 11000 else error.get("errmsg", "Write failed")
+        for index, error in (await reservations.insert_many(documents)).items()
+    }
+
+    results = []
+    bookings = []
+    position = 0
+    for row_number, doc, error in chunk:
+        if doc is None:
+            results.append({"row": row_number, "success": False, "error": error})
+            continue
+        if position in failed:
+            results.append({"row": row_number, "success": False, "error": failed[position]})
+        else:
+            results.append({"row": row_number, "success": True, "id": doc["id"]})
+            booking = reservation_slot(doc)
+            if booking:
+                bookings.append(booking)
+        position += 1
+
+    # Imports are authoritative: occupancy is counted but capacity isn't enforced
+    await availability.add_many(bookings)
+    return results
+
+
+@api_router.post("/reservations/bulk", status_code=status.HTTP_200_OK)
+async def create_reservations_bulk(
+    request: Request,
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000),
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
+    """Import reservations from a JSON array or an NDJSON stream (application/x-ndjson)
+
+    Rows are validated individually and written with unordered insert_many in chunks of
+    chunk_size. The response streams one NDJSON result per input row followed by a summary.
+    """
+    # The body is read up front: Starlette listens for disconnects on the same receive
+    # channel while streaming, so it can't be consumed lazily from the response generator
+    rows = parse_bulk_rows(await request.body(), request.headers.get("content-type", ""))
+
+    async def results():
+        inserted = failed = 0
+        chunk = []
+        valid_in_chunk = 0
+
+        async def flush():
+            nonlocal inserted, failed
+            lines = []
+            for result in await insert_reservation_chunk(chunk, reservations):
+                if result["success"]:
+                    inserted += 1
+                else:
+                    failed += 1
+                lines.append(dumps(result))
+            chunk.clear()
+            return b"\n".join(lines) + b"\n"
+
+        for row_number, (row, error) in enumerate(rows):
+            doc = None
+            if error is None:
+                try:
+                    if not isinstance(row, dict):
+                        raise ValueError("Expected a JSON object")
+                    doc = ReservationCreate(**row).dict()
+                    doc["id"] = str(uuid.uuid4())
+                    doc["status"] = "pending"
+                    doc["created_at"] = datetime.utcnow()
+                    doc["active"] = True
+                except ValidationError as e:
+                    error = "; ".join(
+                        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+                    )
+                except ValueError as e:
+                    error = str(e)
+            chunk.append((row_number, doc, error))
+            if doc is not None:
+                valid_in_chunk += 1
+            if valid_in_chunk >= chunk_size:
+                yield await flush()
+                valid_in_chunk = 0
+
+        if chunk:
+            yield await flush()
+        logger.info(f"Bulk reservation import: {inserted} inserted, {failed} failed")
+        yield dumps({"done": True, "inserted": inserted, "failed": failed}) + b"\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def reservation_filters(
+    status_filter: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    name: Optional[str] = None,
+    phone: Optional[str] = None,
+) -> dict:
+    """Mongo filter for the admin reservation listing and export"""
+    query = {}
+    if status_filter:
+        if status_filter not in RESERVATION_STATUSES:
+            raise HTTPException(status_code=400, detail="Invalid status")
+        query["status"] = status_filter
+    if date_from or date_to:
+        query["date"] = {}
+        if date_from:
+            query["date"]["$gte"] = date_from
+        if date_to:
+            query["date"]["$lte"] = date_to
+    # Anchored, case-sensitive prefixes so the match can use an index
+    if name:
+        query["name"] = {"$regex": "^" + re.escape(name)}
+    if phone:
+        query["phone"] = {"$regex": "^" + re.escape(phone)}
+    return query
+
+
+EXPORT_BATCH_SIZE = settings.EXPORT_BATCH_SIZE
+
+
+def check_archive_queryable(include_archived: bool) -> None:
+    if include_archived and not reservation_archiver.store.queryable:
+        raise HTTPException(
+            status_code=400,
+            detail="Les réservations archivées sont stockées en fichiers (RESERVATION_ARCHIVE_BACKEND=files) et ne peuvent pas être consultées ici.",
+        )
+
+
+RESERVATION_EXPORT_FIELDS = [
+    "id", "name", "email", "phone", "date", "time", "guests", "message", "status", "created_at",
+]
+
+
+@api_router.get("/reservations/export")
+async def export_reservations(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    include_archived: bool = False,
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
+    """Stream reservations as NDJSON or CSV, oldest first (admin)"""
+    check_archive_queryable(include_archived)
+    query = reservation_filters(status_filter, date_from, date_to)
+    columns = export_columns(fields, RESERVATION_EXPORT_FIELDS)
+    cursor = reservations.export(query, columns, batch_size, include_archived)
+    return export_response(cursor, export_format, columns, batch_size, "reservations")
 
 
 @api_router.get("/reservations", response_model=List[dict])
-async def get_reservations():
-    """Get all reservations (admin)"""
-    reservations = await db.reservations.find().sort("created_at", -1).to_list(1000)
-    for res in reservations:
-        res.pop('_id', None)
-        if isinstance(res.get('created_at'), datetime):
-            res['created_at'] = res['created_at'].isoformat()
-    return reservations
+async def get_reservations(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    name: Optional[str] = None,
+    phone: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
+    """Get reservations newest first, one page at a time (admin)
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    check_archive_queryable(include_archived)
+    query = reservation_filters(status_filter, date_from, date_to, name, phone)
+    try:
+        page = await reservations.page(query, limit, cursor, export_columns(fields, []), include_archived)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {}
+    # Documents come straight from our collection: skip response_model validation
+    return FastJSONResponse(page.items, headers=headers)
 
 
 @api_router.get("/reservations/{reservation_id}", response_model=dict)
-async def get_reservation(reservation_id: str):
+async def get_reservation(
+    reservation_id: str,
+    include_archived: bool = False,
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
     """Get a specific reservation"""
-    reservation = await db.reservations.find_one({"id": reservation_id})
+    check_archive_queryable(include_archived)
+    reservation = await reservations.get(reservation_id, include_archived)
     if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    reservation.pop('_id', None)
-    if isinstance(reservation.get('created_at'), datetime):
-        reservation['created_at'] = reservation['created_at'].isoformat()
-    return reservation
+    return FastJSONResponse(reservation)
 
 
 @api_router.patch("/reservations/{reservation_id}/status", response_model=dict)
-async def update_reservation_status(reservation_id: str, status: str):
+async def update_reservation_status(
+    reservation_id: str,
+    status: str,
+    reservations: ReservationRepository = Depends(reservation_repository),
+):
     """Update reservation status"""
-    if status not in ["pending", "confirmed", "cancelled"]:
+    if status not in RESERVATION_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.reservations.update_one(
-        {"id": reservation_id},
-        {"$set": {"status": status}}
-    )
+    try:
+        previous = await reservations.set_status(
+            reservation_id, status, status in ACTIVE_STATUSES, NOTIFICATION_FIELDS,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=DUPLICATE_RESERVATION)
     
-    if result.modified_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Reservation not found")
+
+    was_active = previous.get("status") in ACTIVE_STATUSES
+    is_active = status in ACTIVE_STATUSES
+    booking = reservation_slot(previous)
+    if booking and was_active and not is_active:
+        await availability.release(*booking)
+    elif booking and is_active and not was_active:
+        if not await availability.reserve(*booking):
+            await reservations.restore_status(reservation_id, status, previous.get("status"))
+            raise HTTPException(
+                status_code=409,
+                detail="Ce créneau est complet, la réservation ne peut pas être réactivée.",
+            )
     
+    if previous.get("status") != status:
+        await enqueue_job("reservation_status_changed", {"status": status, "reservation": previous})
     return {"success": True, "message": f"Reservation status updated to {status}"}
 
 
 # ============== Reviews Endpoints ==============
 
 @api_router.get("/reviews", response_model=List[dict])
-async def get_reviews():
-    """Get all reviews"""
-    reviews = await db.reviews.find().to_list(100)
-    for review in reviews:
-        review.pop('_id', None)
-    return reviews
+async def get_reviews(
+    request: Request,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    reviews: ReviewRepository = Depends(review_repository),
+):
+    """Get reviews newest first, one page at a time
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def load():
+        page = await reviews.page(limit, cursor)
+        return Payload(page.items, {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {})
+
+    return await catalog_response(request, "reviews", f"{limit}:{cursor or ''}", load)
+
+
+@api_router.get("/reviews/stats", response_model=dict)
+async def get_review_stats(request: Request, reviews: ReviewRepository = Depends(review_repository)):
+    """Review count, average rating and 1-5 histogram"""
+    return await catalog_response(request, "reviews", "stats", reviews.stats)
+
+
+REVIEW_EXPORT_FIELDS = ["id", "name", "rating", "date", "comment", "avatar", "created_at"]
+
+
+@api_router.get("/reviews/export")
+async def export_reviews(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    reviews: ReviewRepository = Depends(review_repository),
+):
+    """Stream reviews as NDJSON or CSV (admin)
+
+    date_from / date_to (YYYY-MM-DD) filter on the submission time, which only
+    reviews posted through the API carry.
+    """
+    query = {}
+    try:
+        if date_from:
+            query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(date_from)
+        if date_to:
+            query.setdefault("created_at", {})["$lt"] = datetime.fromisoformat(date_to) + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    columns = export_columns(fields, REVIEW_EXPORT_FIELDS)
+    cursor = reviews.export(query, columns, batch_size)
+    return export_response(cursor, export_format, columns, batch_size, "reviews")
 
 
 @api_router.post("/reviews", response_model=dict, status_code=status.HTTP_201_CREATED)
-async def create_review(review: ReviewCreate):
+async def create_review(review: ReviewCreate, reviews: ReviewRepository = Depends(review_repository)):
     """Create a new review"""
-    import uuid
-    
     review_dict = review.dict()
     review_dict["id"] = str(uuid.uuid4())
     review_dict["date"] = "Aujourd'hui"
     review_dict["avatar"] = review.name[0].upper() if review.name else "?"
-    
-    result = await db.reviews.insert_one(review_dict)
-    
-    if result.inserted_id:
-        review_dict.pop('_id', None)
-        return {"success": True, "review": review_dict}
-    
-    raise HTTPException(status_code=500, detail="Failed to create review")
+    review_dict["created_at"] = datetime.utcnow()
+
+    review_dict = await reviews.create(review_dict)
+    return FastJSONResponse({"success": True, "review": review_dict}, status_code=status.HTTP_201_CREATED)
 
 
 # ============== Gallery Endpoints ==============
 
 @api_router.get("/gallery", response_model=List[dict])
-async def get_gallery():
+async def get_gallery(request: Request, gallery: GalleryRepository = Depends(gallery_repository)):
     """Get all gallery images"""
-    images = await db.gallery.find().to_list(100)
-    for img in images:
-        img.pop('_id', None)
-    return images
+    return await catalog_response(request, "gallery", "", gallery.images)
 
 
 @api_router.get("/gallery/{category}", response_model=List[dict])
-async def get_gallery_by_category(category: str):
+async def get_gallery_by_category(
+    category: str,
+    request: Request,
+    gallery: GalleryRepository = Depends(gallery_repository),
+):
     """Get gallery images by category"""
-    images = await db.gallery.find({"category": category}).to_list(100)
-    for img in images:
-        img.pop('_id', None)
-    return images
+    async def load():
+        return await gallery.images(category)
+
+    return await catalog_response(request, "gallery", category, load)
+
+
+@api_router.post("/gallery", response_model=GalleryImage, status_code=status.HTTP_201_CREATED)
+async def upload_gallery_image(
+    file: UploadFile = File(...),
+    alt: str = Form(..., min_length=1, max_length=200),
+    category: str = Form(..., min_length=1, max_length=50),
+    gallery: GalleryRepository = Depends(gallery_repository),
+):
+    """Upload a gallery image (admin); responsive variants are rendered before the response"""
+    if not image_pipeline.enabled:
+        raise HTTPException(status_code=503, detail="Le traitement des images n'est pas disponible (Pillow manquant).")
+    data = await file.read(settings.GALLERY_MAX_UPLOAD_BYTES + 1)
+    if len(data) > settings.GALLERY_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image trop volumineuse (maximum {settings.GALLERY_MAX_UPLOAD_BYTES // (1024 * 1024)} Mo).",
+        )
+    try:
+        rendered = await image_pipeline.process(data)
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=f"Image illisible : {e}")
+    except BrokenProcessPool:
+        # The pipeline starts a fresh pool for the next upload
+        logger.error("Image worker process died, pool restarted")
+        raise HTTPException(status_code=503, detail="Le traitement de l'image a échoué, merci de réessayer.")
+
+    image = GalleryImage(alt=alt, category=category, **rendered)
+    await gallery.add(image.dict(exclude_none=True))
+    return image
+
+
+# ============== Availability Endpoints ==============
+
+@api_router.get("/availability", response_model=dict)
+async def get_availability(date: str, guests: Optional[str] = None):
+    """Remaining capacity of each reservation slot on a date (YYYY-MM-DD)"""
+    try:
+        party = party_size(guests) if guests else None
+        return await availability.day(date, party)
+    except SlotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ============== Admin Endpoints ==============
+
+@api_router.get("/admin/indexes", response_model=dict)
+async def get_index_report():
+    """Report missing, unused and undeclared indexes and the plan of each known query"""
+    return await index_report(db)
+
+
+@api_router.get("/admin/pool", response_model=dict)
+async def get_pool_stats():
+    """Connection pool configuration and per-server usage"""
+    return {
+        "options": settings.mongo_client_options(),
+        "catalog_read_preference": repr(catalog_db.read_preference),
+        "pools": pool_listener.stats(),
+    }
+
+
+@api_router.get("/admin/jobs", response_model=dict)
+async def get_job_stats():
+    """Outbox jobs by state"""
+    return await job_queue.stats()
+
+
+# ============== Metrics ==============
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 # ============== Health Check ==============
 
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up and serving; never touches the database"""
+    return {"status": "alive"}
+
+
+@api_router.get("/health/ready")
+async def readiness_check():
+    """Ready for traffic: initialization finished and MongoDB answers a ping"""
+    checks = dict(readiness)
+    errors = dict(readiness_errors)
+    try:
+        await asyncio.wait_for(db.command("ping"), settings.READINESS_PING_TIMEOUT_SECONDS)
+        checks["mongodb"] = True
+    except Exception as e:
+        checks["mongodb"] = False
+        errors["mongodb"] = str(e) or type(e).__name__
+    ready = all(checks.values())
+    return FastJSONResponse(
+        {"status": "ready" if ready else "not_ready", "checks": checks, "errors": errors},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -261,10 +1171,67 @@ async def health_check():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Gallery variants; their names change with their content so browsers may cache them for good
+app.mount(
+    f"{settings.MEDIA_URL}/gallery",
+    ImmutableStaticFiles(directory=Path(settings.MEDIA_DIR) / "gallery", check_dir=False),
+    name="gallery_media",
+)
+
+# Uploads are refused before Starlette spools them; the margin leaves room for the other form fields
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={"/api/gallery": settings.GALLERY_MAX_UPLOAD_BYTES + 64 * 1024},
+)
+
+# Innermost so rejections still get CORS headers and are recorded by the metrics
+if settings.RATE_LIMIT_BACKEND == "mongo":
+    rate_limit_backend = MongoRateLimitBackend(db.rate_limits)
+else:
+    rate_limit_backend = MemoryRateLimitBackend()
+
+app.add_middleware(
+    RateLimitMiddleware,
+    rules=[
+        RateLimit("POST", "/api/reservations", settings.RESERVATION_RATE_PER_MINUTE / 60, settings.RESERVATION_BURST),
+        RateLimit("POST", "/api/reviews", settings.REVIEW_RATE_PER_MINUTE / 60, settings.REVIEW_BURST),
+    ],
+    backend=rate_limit_backend,
+    concurrency=settings.CONCURRENCY_LIMITS,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Menu-Version", "Idempotent-Replayed", "Retry-After"],
+)
+
+# Catalog bodies carry an ETag and are compressed once per version, so they can afford
+# high levels; reservation listings and exports are compressed on every request
+COMPRESSION_ROUTE_LEVELS = {
+    "/api/restaurant": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/menu": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/menu/{category_id}": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/gallery": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/gallery/{category}": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/reviews": {"zstd": 19, "br": 11, "gzip": 9},
+    "/api/reservations/export": {"zstd": 1, "br": 1, "gzip": 1},
+    "/api/reviews/export": {"zstd": 1, "br": 1, "gzip": 1},
+}
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    encodings=settings.COMPRESSION_ENCODINGS,
+    route_levels=COMPRESSION_ROUTE_LEVELS,
+    cache_entries=settings.COMPRESSION_CACHE_ENTRIES,
+)
+
+app.add_middleware(
+    MetricsMiddleware,
+    slow_request_ms=settings.METRICS_SLOW_REQUEST_MS,
+    sample_rate=settings.METRICS_TRACE_SAMPLE_RATE,
 )
@@ -0,0 +1,191 @@
+"""
+Environment driven configuration for the Majestea backend
+"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+def _optional_int(name: str):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# ============== MongoDB ==============
+
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+
+# Worker processes serving the app (set by launcher.py), each with its own connection pool
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+# Connections all workers together may open; split evenly unless MONGO_MAX_POOL_SIZE is given.
+# Every worker also keeps a couple of monitoring connections per server on top of its pool.
+MONGO_CONNECTION_BUDGET = _optional_int('MONGO_CONNECTION_BUDGET')
+if 'MONGO_MAX_POOL_SIZE' in os.environ or not MONGO_CONNECTION_BUDGET:
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+else:
+    MONGO_MAX_POOL_SIZE = max(1, MONGO_CONNECTION_BUDGET // max(1, WEB_CONCURRENCY))
+MONGO_MIN_POOL_SIZE = min(int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')), MONGO_MAX_POOL_SIZE)
+MONGO_MAX_IDLE_TIME_MS = _optional_int('MONGO_MAX_IDLE_TIME_MS')
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _optional_int('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = _optional_int('MONGO_SOCKET_TIMEOUT_MS')
+# Comma separated, in order of preference: zstd (needs zstandard), snappy (python-snappy), zlib
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+# Connections opened at startup so the first requests don't pay for the handshakes
+MONGO_POOL_PREWARM = int(os.environ.get('MONGO_POOL_PREWARM', str(MONGO_MIN_POOL_SIZE)))
+
+# Catalog collections (restaurant, menu, reviews, gallery) tolerate slightly stale reads
+MONGO_CATALOG_READ_PREFERENCE = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_CATALOG_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_CATALOG_MAX_STALENESS_SECONDS', '90'))
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def mongo_client_options() -> dict:
+    """Keyword arguments for AsyncIOMotorClient, leaving unset options at the driver defaults"""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def catalog_read_preference():
+    """Read preference for catalog reads; max staleness only applies off the primary"""
+    try:
+        mode = READ_PREFERENCES[MONGO_CATALOG_READ_PREFERENCE]
+    except KeyError:
+        raise ValueError(f"Unknown MONGO_CATALOG_READ_PREFERENCE: {MONGO_CATALOG_READ_PREFERENCE!r}")
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=MONGO_CATALOG_MAX_STALENESS_SECONDS)
+
+
+def catalog_reads_may_lag() -> bool:
+    return MONGO_CATALOG_READ_PREFERENCE != "primary"
+
+
+# How long /api/health/ready waits on a MongoDB ping before reporting not ready
+READINESS_PING_TIMEOUT_SECONDS = float(os.environ.get('READINESS_PING_TIMEOUT_SECONDS', '2'))
+
+
+# ============== Caching ==============
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '512'))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '300'))
+CACHE_POLL_INTERVAL_SECONDS = float(os.environ.get('CACHE_POLL_INTERVAL_SECONDS', '30'))
+# Reads coalesced while in flight (single-flight), by cache namespace: restaurant, menu,
+# reviews, gallery, and menu_version for /api/menu/version which is not cached
+COALESCE_NAMESPACES = [n.strip() for n in os.environ.get(
+    'COALESCE_NAMESPACES', 'restaurant,menu,reviews,gallery,menu_version'
+).split(',') if n.strip()]
+# Unix socket relaying invalidations between workers when change streams are unavailable (set by launcher.py)
+INVALIDATION_BUS_SOCKET = os.environ.get('INVALIDATION_BUS_SOCKET', '')
+
+# HTTP caching policy for the public catalog endpoints
+CATALOG_CACHE_CONTROL = os.environ.get(
+    'CATALOG_CACHE_CONTROL',
+    "public, max-age={}, stale-while-revalidate={}".format(
+        int(os.environ.get('CATALOG_MAX_AGE_SECONDS', '60')),
+        int(os.environ.get('CATALOG_STALE_WHILE_REVALIDATE_SECONDS', '300')),
+    ),
+)
+
+# Site bundle: memory only unless a directory is given, where it is written and memory-mapped
+SITE_BUNDLE_DIR = os.environ.get('SITE_BUNDLE_DIR', '')
+SITE_BUNDLE_TOP_REVIEWS = int(os.environ.get('SITE_BUNDLE_TOP_REVIEWS', '6'))
+
+# ============== Compression ==============
+
+# Order of preference among the codings a client accepts; unavailable codecs are skipped
+COMPRESSION_ENCODINGS = [c.strip() for c in os.environ.get('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',') if c.strip()]
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '1024'))
+COMPRESSION_CACHE_ENTRIES = int(os.environ.get('COMPRESSION_CACHE_ENTRIES', '256'))
+
+# ============== Gallery images ==============
+
+# Variants are written under MEDIA_DIR/gallery and served from MEDIA_URL/gallery
+MEDIA_DIR = os.environ.get('MEDIA_DIR', str(ROOT_DIR / 'media'))
+MEDIA_URL = os.environ.get('MEDIA_URL', '/api/media')
+# Uploaded originals, kept out of the served directory
+GALLERY_ORIGINALS_DIR = os.environ.get('GALLERY_ORIGINALS_DIR', str(ROOT_DIR / 'uploads' / 'gallery'))
+GALLERY_MAX_UPLOAD_BYTES = int(os.environ.get('GALLERY_MAX_UPLOAD_BYTES', str(15 * 1024 * 1024)))
+GALLERY_MAX_PIXELS = int(os.environ.get('GALLERY_MAX_PIXELS', '40000000'))
+GALLERY_VARIANT_WIDTHS = [int(w) for w in os.environ.get('GALLERY_VARIANT_WIDTHS', '320,640,960,1280').split(',') if w.strip()]
+# In order of preference; the last one is the <img> fallback
+GALLERY_VARIANT_FORMATS = [f.strip() for f in os.environ.get('GALLERY_VARIANT_FORMATS', 'avif,webp').split(',') if f.strip()]
+GALLERY_VARIANT_QUALITY = int(os.environ.get('GALLERY_VARIANT_QUALITY', '75'))
+GALLERY_IMAGE_WORKERS = int(os.environ.get('GALLERY_IMAGE_WORKERS', '2'))
+
+# ============== Reservations ==============
+
+AVAILABILITY_SLOT_MINUTES = int(os.environ.get('AVAILABILITY_SLOT_MINUTES', '30'))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_INSERT_CHUNK_SIZE', '1000'))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+# Reservations whose visit date is more than this many days old leave the reservations
+# collection (0 keeps them forever), checked every RESERVATION_ARCHIVE_INTERVAL_SECONDS
+RESERVATION_ARCHIVE_AFTER_DAYS = int(os.environ.get('RESERVATION_ARCHIVE_AFTER_DAYS', '365'))
+RESERVATION_ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('RESERVATION_ARCHIVE_INTERVAL_SECONDS', '86400'))
+RESERVATION_ARCHIVE_BATCH_SIZE = int(os.environ.get('RESERVATION_ARCHIVE_BATCH_SIZE', '1000'))
+# collection: reservations_archive, still readable with include_archived; files: monthly
+# reservations-YYYY-MM.ndjson.gz under RESERVATION_ARCHIVE_DIR
+RESERVATION_ARCHIVE_BACKEND = os.environ.get('RESERVATION_ARCHIVE_BACKEND', 'collection')
+RESERVATION_ARCHIVE_DIR = os.environ.get('RESERVATION_ARCHIVE_DIR', str(ROOT_DIR / 'archives'))
+
+# Idempotency-Key records are kept this long; a claim older than the lock can be taken over
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '30'))
+
+# ============== Background jobs ==============
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_SECONDS = float(os.environ.get('JOB_BACKOFF_SECONDS', '2'))
+JOB_MAX_BACKOFF_SECONDS = float(os.environ.get('JOB_MAX_BACKOFF_SECONDS', '300'))
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', '5'))
+JOB_LOCK_SECONDS = float(os.environ.get('JOB_LOCK_SECONDS', '60'))
+# Finished jobs are removed from the outbox after this long
+OUTBOX_RETENTION_SECONDS = int(os.environ.get('OUTBOX_RETENTION_SECONDS', str(7 * 86400)))
+NOTIFICATION_TRANSPORT = os.environ.get('NOTIFICATION_TRANSPORT', 'stub')
+
+# ============== Rate limiting ==============
+
+# memory: per process; mongo: shared by every worker through the rate_limits collection
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Per client IP: sustained requests per minute and burst size
+RESERVATION_RATE_PER_MINUTE = float(os.environ.get('RESERVATION_RATE_PER_MINUTE', '5'))
+RESERVATION_BURST = int(os.environ.get('RESERVATION_BURST', '5'))
+REVIEW_RATE_PER_MINUTE = float(os.environ.get('REVIEW_RATE_PER_MINUTE', '2'))
+REVIEW_BURST = int(os.environ.get('REVIEW_BURST', '3'))
+# Requests served at once per route class before shedding with 503
+CONCURRENCY_LIMITS = {
+    "read": int(os.environ.get('CONCURRENCY_LIMIT_READ', '512')),
+    "write": int(os.environ.get('CONCURRENCY_LIMIT_WRITE', '64')),
+    "admin": int(os.environ.get('CONCURRENCY_LIMIT_ADMIN', '8')),
+}
+
+# ============== Metrics ==============
+
+METRICS_SLOW_REQUEST_MS = float(os.environ.get('METRICS_SLOW_REQUEST_MS', '500'))
+METRICS_TRACE_SAMPLE_RATE = float(os.environ.get('METRICS_TRACE_SAMPLE_RATE', '1.0'))
@@ -0,0 +1,151 @@
+"""
+Versioned, precompressed snapshot of the public site data served by GET /api/site-bundle
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from responses import dumps
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Cache namespaces whose invalidation makes the bundle stale
+BUNDLE_NAMESPACES = ("restaurant", "menu", "gallery", "reviews")
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz", "identity": ""}
+
+
+class SiteBundle:
+    """
+    Restaurant info, menu, gallery and the latest reviews rendered as one JSON document.
+
+    Every encoding is compressed once per build. Bodies live in memory, or when a directory
+    is given, in files that are memory-mapped so every worker shares the same page cache.
+    """
+
+    def __init__(self, db, top_reviews: int = 6, directory: Optional[str] = None):
+        # Reads go to the primary: rebuilds are rare and must not pick up a lagging secondary
+        self.db = db
+        self.top_reviews = top_reviews
+        self.directory = Path(directory) if directory else None
+        self.version: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self._bodies: Dict[str, object] = {}
+        self._stale = False
+        self._rebuild: Optional[asyncio.Task] = None
+
+    @property
+    def encodings(self) -> List[str]:
+        return list(self._bodies)
+
+    def body(self, encoding: str) -> bytes:
+        return self._bodies[encoding][:]
+
+    async def _load(self) -> dict:
+        restaurant, menu, gallery, reviews = await asyncio.gather(
+            self.db.restaurant.find_one({}, {"_id": 0}),
+            self.db.menu_categories.find({}, {"_id": 0}).to_list(100),
+            self.db.gallery.find({}, {"_id": 0}).to_list(100),
+            self.db.reviews.find({}, {"_id": 0})
+                .sort([("created_at", -1), ("id", -1)])
+                .limit(self.top_reviews)
+                .to_list(self.top_reviews),
+        )
+        return {"restaurant": restaurant, "menu": menu, "gallery": gallery, "reviews": reviews}
+
+    @staticmethod
+    def _compress(body: bytes) -> Dict[str, bytes]:
+        bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+        return {coding: bodies[coding] for coding in ENCODINGS if coding in bodies}
+
+    def _write(self, version: str, bodies: Dict[str, bytes]) -> Dict[str, mmap.mmap]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        mapped = {}
+        for coding, body in bodies.items():
+            path = self.directory / f"site-bundle.json{ENCODINGS[coding]}"
+            tmp = path.with_name(f"{path.name}.{version}.{os.getpid()}.tmp")
+            tmp.write_bytes(body)
+            # Readers keep their mapping of the previous file, the rename swaps it atomically
+            os.replace(tmp, path)
+            with open(path, "rb") as f:
+                mapped[coding] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    async def build(self) -> str:
+        """Render, compress and publish a new snapshot; returns its version"""
+        data = await self._load()
+        body = dumps(data)
+        version = hashlib.blake2b(body, digest_size=8).hexdigest()
+        if version == self.version:
+            return version
+        # Brotli at quality 11 takes a few milliseconds, keep it off the event loop
+        bodies = await asyncio.to_thread(self._compress, body)
+        if self.directory is not None:
+            bodies = await asyncio.to_thread(self._write, version, bodies)
+        previous, self._bodies = self._bodies, bodies
+        for old in previous.values():
+            if isinstance(old, mmap.mmap):
+                old.close()
+        self.version = version
+        self.etag = f'"{version}"'
+        self.last_modified = formatdate(usegmt=True)
+        logger.info(
+            f"Site bundle {version} built: "
+            + ", ".join(f"{coding}={len(b)}B" for coding, b in bodies.items())
+        )
+        return version
+
+    def mark_stale(self, namespace: Optional[str] = None) -> None:
+        """Schedule a rebuild after a write; requests keep getting the previous snapshot meanwhile"""
+        if namespace is not None and namespace not in BUNDLE_NAMESPACES:
+            return
+        self._stale = True
+        if self._rebuild is None or self._rebuild.done():
+            try:
+                self._rebuild = asyncio.get_running_loop().create_task(self._rebuild_while_stale())
+            except RuntimeError:
+                pass  # no loop (CLI tools): the next ensure_built() rebuilds
+
+    async def _rebuild_while_stale(self) -> None:
+        # Writes arriving during a build trigger exactly one more build
+        while self._stale:
+            self._stale = False
+            try:
+                await self.build()
+            except Exception as e:
+                # Still stale: the next write or ensure_built() tries again
+                self._stale = True
+                logger.error(f"Site bundle rebuild failed: {e}")
+                return
+
+    async def ensure_built(self) -> None:
+        if self.version is None or (self._stale and (self._rebuild is None or self._rebuild.done())):
+            self._stale = False
+            try:
+                await self.build()
+            except Exception:
+                self._stale = True
+                raise
+
+    async def stop(self) -> None:
+        if self._rebuild is not None and not self._rebuild.done():
+            self._rebuild.cancel()
+            try:
+                await self._rebuild
+            except asyncio.CancelledError:
+                pass
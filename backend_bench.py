@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Majestea Backend Benchmark Suite
+Drives every API route at a configurable concurrency and records latency percentiles,
+throughput and allocations per request as JSON, to compare runs between commits.
+
+    python backend_bench.py --mongomock                  # in-process, no database needed
+    python backend_bench.py                              # in-process against MONGO_URL (local mongod)
+    python backend_bench.py --uvicorn                    # spawn uvicorn against MONGO_URL
+    python backend_bench.py --url http://host:8001/api   # an already running server
+    python backend_bench.py --mongomock --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+
+def reservation_body():
+    # Spread bookings over a year of lunch slots so capacity checks don't turn them into 409s
+    day = date.today() + timedelta(days=random.randint(30, 395))
+    return {
+        "name": "Bench " + uuid.uuid4().hex[:6],
+        "phone": "06" + str(random.randint(10000000, 99999999)),
+        "date": day.isoformat(),
+        "time": random.choice(["12:00", "12:30", "13:00", "19:30", "20:00"]),
+        "guests": "2",
+    }
+
+
+def review_body():
+    return {"name": "Bench", "rating": random.randint(1, 5), "comment": "Benchmark"}
+
+
+# Admin menu writes go to a category of their own, created by prepare_state
+BENCH_CATEGORY = "bench"
+
+
+def menu_item_body():
+    return {"name": "Bench " + uuid.uuid4().hex[:6], "price": random.randint(4, 30), "description": "Benchmark",
+            "category_id": BENCH_CATEGORY}
+
+
+def menu_category_body():
+    return {"id": "bench-" + uuid.uuid4().hex[:12], "name": "Bench"}
+
+
+def png_image(width=1280, height=960):
+    """RGB gradient PNG built without Pillow, so the client side needs no imaging library"""
+    rows = b"".join(
+        b"\x00" + bytes(channel for x in range(width) for channel in (x * 255 // width, y * 255 // height, 128))
+        for y in range(height)
+    )
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+async def create_menu_items(client, state, count):
+    """Items for menu_item_delete to remove, one per request"""
+    state["menu_items_to_delete"] = []
+    for _ in range(count):
+        response = await client.post("/menu/items", json=menu_item_body())
+        response.raise_for_status()
+        state["menu_items_to_delete"].append(response.json()["item"]["id"])
+
+
+async def create_menu_categories(client, state, count):
+    """Categories for menu_category_delete to remove, one per request"""
+    state["menu_categories_to_delete"] = []
+    for _ in range(count):
+        response = await client.post("/menu", json=menu_category_body())
+        response.raise_for_status()
+        state["menu_categories_to_delete"].append(response.json()["category"]["id"])
+
+
+class Scenario:
+    """
+    One benchmarked route. path may be a format string over the prepared state, or a
+    callable taking the state for paths that change on every request. setup(client,
+    state, count) runs before the scenario with the number of requests it will send.
+    Scenarios needing a real mongod are skipped with --mongomock.
+    """
+
+    def __init__(self, name, method, path, params=None, body=None, content=None, headers=None, files=None,
+                 data=None, setup=None, mongod_only=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+        self.content = content
+        self.headers = headers
+        self.files = files
+        self.data = data
+        self.setup = setup
+        self.mongod_only = mongod_only
+
+    def request_kwargs(self, state):
+        kwargs = {}
+        path = self.path(state) if callable(self.path) else self.path.format(**state)
+        if self.params:
+            kwargs["params"] = self.params
+        if self.body:
+            kwargs["json"] = self.body()
+        if self.content:
+            kwargs["content"] = self.content()
+        if self.headers:
+            kwargs["headers"] = self.headers
+        if self.files:
+            kwargs["files"] = self.files(state)
+        if self.data:
+            kwargs["data"] = self.data
+        return path, kwargs
+
+
+def bulk_content():
+    return json.dumps([reservation_body() for _ in range(50)])
+
+
+SCENARIOS = [
+    Scenario("root", "GET", "/"),
+    Scenario("health", "GET", "/health"),
+    Scenario("health_live", "GET", "/health/live"),
+    Scenario("health_ready", "GET", "/health/ready"),
+    Scenario("metrics", "GET", "/metrics"),
+    Scenario("site_bundle", "GET", "/site-bundle", headers={"accept-encoding": "br, gzip"}),
+    Scenario("restaurant", "GET", "/restaurant"),
+    Scenario("menu", "GET", "/menu"),
+    Scenario("menu_category", "GET", "/menu/mains"),
+    Scenario("menu_version", "GET", "/menu/version"),
+    Scenario("menu_search", "GET", "/menu/search", params={"q": "boeuf", "max_price": 30}),
+    Scenario("gallery", "GET", "/gallery"),
+    Scenario("gallery_category", "GET", "/gallery/plats"),
+    Scenario("reviews", "GET", "/reviews"),
+    Scenario("reviews_stats", "GET", "/reviews/stats"),
+    Scenario("availability", "GET", "/availability", params={"date": (date.today() + timedelta(days=45)).isoformat()}),
+    Scenario("reservation_create", "POST", "/reservations", body=reservation_body),
+    Scenario("reservation_bulk_50", "POST", "/reservations/bulk", content=bulk_content,
+             headers={"content-type": "application/json"}),
+    Scenario("reservations_list", "GET", "/reservations", params={"limit": 50}),
+    Scenario("reservation_get", "GET", "/reservations/{reservation_id}"),
+    Scenario("reservation_status", "PATCH", "/reservations/{reservation_id}/status", params={"status": "confirmed"}),
+    Scenario("reservations_export", "GET", "/reservations/export", params={"format": "ndjson"}),
+    Scenario("review_create", "POST", "/reviews", body=review_body),
+    Scenario("reviews_export", "GET", "/reviews/export", params={"format": "csv"}),
+    # Menu writes last: they invalidate the catalog cache and grow the menu the reads above serve
+    Scenario("menu_item_create", "POST", "/menu/items", body=menu_item_body),
+    Scenario("menu_item_update", "PATCH", "/menu/items/{menu_item_id}",
+             body=lambda: {"price": random.randint(4, 30)}),
+    Scenario("menu_item_delete", "DELETE", lambda state: f"/menu/items/{state['menu_items_to_delete'].pop()}",
+             setup=create_menu_items),
+    Scenario("menu_category_create", "POST", "/menu", body=menu_category_body),
+    Scenario("menu_category_rename", "PATCH", f"/menu/{BENCH_CATEGORY}",
+             body=lambda: {"name": "Bench " + uuid.uuid4().hex[:6]}),
+    Scenario("menu_category_delete", "DELETE", lambda state: f"/menu/{state['menu_categories_to_delete'].pop()}",
+             setup=create_menu_categories),
+    Scenario("gallery_upload", "POST", "/gallery",
+             files=lambda state: {"file": ("bench.png", state["gallery_png"], "image/png")},
+             data={"alt": "Benchmark", "category": "bench"}),
+    Scenario("admin_jobs", "GET", "/admin/jobs"),
+    Scenario("admin_pool", "GET", "/admin/pool"),
+    # $indexStats and explain are not implemented by mongomock
+    Scenario("admin_indexes", "GET", "/admin/indexes", mongod_only=True),
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, scenario, state, requests_count, concurrency):
+    latencies = []
+    statuses = {}
+    remaining = iter(range(requests_count))
+
+    async def worker():
+        for _ in remaining:
+            path, kwargs = scenario.request_kwargs(state)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, path, **kwargs)
+            await response.aread()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "errors": sum(count for code, count in statuses.items() if code >= 500),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95": round(percentile(latencies, 95), 3) if latencies else None,
+            "p99": round(percentile(latencies, 99), 3) if latencies else None,
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+async def measure_allocations(client, scenario, state, samples):
+    """Mean peak of Python heap growth per request, measured sequentially with tracemalloc"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            path, kwargs = scenario.request_kwargs(state)
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            response = await client.request(scenario.method, path, **kwargs)
+            await response.aread()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes_per_request": int(sum(peaks) / len(peaks)) if peaks else None}
+
+
+async def prepare_state(client):
+    """Create the records that parameterised routes point at"""
+    response = await client.post("/reservations", json=reservation_body())
+    response.raise_for_status()
+    state = {"reservation_id": response.json()["reservation"]["id"], "gallery_png": png_image()}
+    response = await client.post("/menu", json={"id": BENCH_CATEGORY, "name": "Bench"})
+    # Left over by a previous run against the same database
+    if response.status_code != 409:
+        response.raise_for_status()
+    response = await client.post("/menu/items", json=menu_item_body())
+    response.raise_for_status()
+    state["menu_item_id"] = response.json()["item"]["id"]
+    return state
+
+
+async def run_benchmarks(client, args, in_process):
+    state = await prepare_state(client)
+    scenarios = [
+        s for s in SCENARIOS
+        if (not args.routes or s.name in args.routes) and not (s.mongod_only and args.mongomock)
+    ]
+    results = {}
+    for scenario in scenarios:
+        if scenario.setup:
+            count = args.warmup + args.requests + (args.alloc_samples if in_process else 0)
+            await scenario.setup(client, state, count)
+        await run_scenario(client, scenario, state, args.warmup, 1)
+        result = await run_scenario(client, scenario, state, args.requests, args.concurrency)
+        if in_process and args.alloc_samples:
+            result.update(await measure_allocations(client, scenario, state, args.alloc_samples))
+        results[scenario.name] = result
+        latency = result["latency_ms"]
+        print(f"{scenario.name:<22} p50={latency['p50']:>8.2f}ms p95={latency['p95']:>8.2f}ms "
+              f"p99={latency['p99']:>8.2f}ms {result['throughput_rps']:>8.1f} req/s  {result['statuses']}")
+    return results
+
+
+BENCH_LIMITS = (
+    "RESERVATION_RATE_PER_MINUTE", "RESERVATION_BURST", "REVIEW_RATE_PER_MINUTE", "REVIEW_BURST",
+    "CONCURRENCY_LIMIT_READ", "CONCURRENCY_LIMIT_WRITE", "CONCURRENCY_LIMIT_ADMIN",
+)
+
+
+def load_app(args):
+    """Import server.app, optionally rebinding it to an in-memory mongomock database"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "majestea_bench")
+    # Every benchmark request comes from one address and all of them run at --concurrency:
+    # lift the per-client write limits and the per-route-class shedding
+    for name in BENCH_LIMITS:
+        os.environ.setdefault(name, "1000000")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if args.mongomock:
+        from repositories import in_memory_database
+
+        database = in_memory_database(os.environ["DB_NAME"])
+        server.client = database.client
+        server.bind_database(database)
+    return server
+
+
+async def run_in_process(args):
+    server = load_app(args)
+    if not args.mongomock:
+        await server.client.drop_database(os.environ["DB_NAME"])
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench/api") as client:
+            await wait_until_ready(client)
+            return await run_benchmarks(client, args, in_process=True)
+    finally:
+        await server.app.router.shutdown()
+
+
+async def wait_until_ready(client, timeout=30.0):
+    """Startup returns before seeding is done: wait for /health/ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s")
+
+
+async def run_against_url(args, url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await wait_until_ready(client)
+        return await run_benchmarks(client, args, in_process=False)
+
+
+def start_uvicorn(port, workers=1):
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "majestea_bench")
+    for name in BENCH_LIMITS:
+        env.setdefault(name, "1000000")
+    if workers > 1:
+        command = [sys.executable, "launcher.py", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not become ready within 30s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print routes whose p95 latency regressed by more than threshold; returns their count"""
+    baseline = json.loads(Path(baseline_path).read_text())["routes"]
+    regressions = 0
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("latency_ms", {}).get("p95")
+        after = result["latency_ms"]["p95"]
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        marker = "REGRESSION" if change > threshold else "ok"
+        if change > threshold:
+            regressions += 1
+        print(f"{name:<22} p95 {before:>8.2f}ms -> {after:>8.2f}ms ({change:+.1%}) {marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Majestea API")
+    parser.add_argument("--url", help="Benchmark an already running server, e.g. http://localhost:8001/api")
+    parser.add_argument("--uvicorn", action="store_true", help="Spawn uvicorn against MONGO_URL")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="With --uvicorn, start this many workers through launcher.py")
+    parser.add_argument("--mongomock", action="store_true", help="In-process against an in-memory database")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="Sequential warm-up requests per route")
+    parser.add_argument("--alloc-samples", type=int, default=20, help="Requests traced for allocations (in-process)")
+    parser.add_argument("--routes", nargs="*", help="Only run these scenarios")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Baseline results JSON to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed p95 regression ratio")
+    args = parser.parse_args()
+
+    if args.url:
+        mode = "url"
+        results = asyncio.run(run_against_url(args, args.url))
+    elif args.uvicorn:
+        mode = "uvicorn"
+        process = start_uvicorn(args.port, args.workers)
+        try:
+            results = asyncio.run(run_against_url(args, f"http://127.0.0.1:{args.port}/api"))
+        finally:
+            process.terminate()
+            process.wait()
+    else:
+        mode = "mongomock" if args.mongomock else "in-process"
+        results = asyncio.run(run_in_process(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "mode": mode,
+            "concurrency": args.concurrency,
+            "workers": args.workers if args.uvicorn else 1,
+            "requests_per_route": args.requests,
+            "python": platform.python_version(),
+        },
+        "routes": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -178,13 +178,15 @@ class MajesteatAPITester:
             # Use future date to avoid validation issues
             future_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
             
+            # A phone number of its own on every run: the same phone, date and time twice is a duplicate
             reservation_data = {
                 "name": "Marie Dubois",
-                "phone": "0612345678",
+                "phone": "06" + str(uuid.uuid4().int)[:8],
                 "date": future_date,
                 "time": "19:00",
                 "guests": "2"
             }
+            self.reservation_data = reservation_data
             
             response = self.session.post(
                 f"{self.base_url}/reservations",
@@ -225,6 +227,47 @@ class MajesteatAPITester:
             self.log_test("Create Reservation", False, f"Request failed: {str(e)}")
             return False
     
+    def test_duplicate_reservation(self):
+        """Test POST /api/reservations refuses the same phone, date and time twice"""
+        if not getattr(self, "reservation_data", None):
+            self.log_test("Duplicate Reservation", False, "No reservation was created to duplicate")
+            return False
+        try:
+            response = self.session.post(
+                f"{self.base_url}/reservations",
+                json=self.reservation_data,
+                timeout=10
+            )
+            
+            if response.status_code != 409:
+                self.log_test("Duplicate Reservation", False, f"Expected status 409, got {response.status_code}", response.text)
+                return False
+                
+            if not response.json().get("detail"):
+                self.log_test("Duplicate Reservation", False, "Missing detail message", response.text)
+                return False
+                
+            self.log_test("Duplicate Reservation", True, "Duplicate reservation refused with 409")
+            return True
+            
+        except Exception as e:
+            self.log_test("Duplicate Reservation", False, f"Request failed: {str(e)}")
+            return False
+    
+    def cleanup(self):
+        """Cancel the reservation created by the tests so its seats are given back"""
+        reservation_id = getattr(self, "test_reservation_id", None)
+        if not reservation_id:
+            return
+        try:
+            self.session.patch(
+                f"{self.base_url}/reservations/{reservation_id}/status",
+                params={"status": "cancelled"},
+                timeout=10
+            )
+        except Exception as e:
+            print(f"⚠️  Could not cancel test reservation {reservation_id}: {str(e)}")
+    
     def test_list_reservations(self):
         """Test GET /api/reservations endpoint"""
         try:
@@ -346,6 +389,7 @@ class MajesteatAPITester:
             self.test_menu,
             self.test_menu_category,
             self.test_create_reservation,
+            self.test_duplicate_reservation,
             self.test_list_reservations,
             self.test_reviews,
             self.test_gallery
@@ -354,9 +398,12 @@ class MajesteatAPITester:
         passed = 0
         total = len(tests)
         
-        for test in tests:
-            if test():
-                passed += 1
+        try:
+            for test in tests:
+                if test():
+                    passed += 1
+        finally:
+            self.cleanup()
         
         print("=" * 60)
         print(f"📊 Test Results: {passed}/{total} tests passed")
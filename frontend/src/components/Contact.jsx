@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
 import { Textarea } from './ui/textarea';
@@ -7,7 +7,7 @@ import { Card, CardContent } from './ui/card';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from './ui/select';
 import { MapPin, Phone, Clock, Send, Calendar, Users, Instagram, Loader2 } from 'lucide-react';
 import { useData } from '../context/DataContext';
-import { createReservation } from '../services/api';
+import { createReservation, newIdempotencyKey } from '../services/api';
 import { toast } from 'sonner';
 import { PeonyFlower, FloralDivider, GoldAccent } from './FloralDecorations';
 
@@ -24,14 +24,18 @@ const Contact = () => {
     message: ''
   });
   const [isSubmitting, setIsSubmitting] = useState(false);
+  // Same key for every retry of an unchanged form, so a resubmission never books twice
+  const idempotencyKey = useRef(newIdempotencyKey());
 
   const handleChange = (e) => {
     const { name, value } = e.target;
     setFormData(prev => ({ ...prev, [name]: value }));
+    idempotencyKey.current = newIdempotencyKey();
   };
 
   const handleSelectChange = (name, value) => {
     setFormData(prev => ({ ...prev, [name]: value }));
+    idempotencyKey.current = newIdempotencyKey();
   };
 
   const handleSubmit = async (e) => {
@@ -46,7 +50,7 @@ const Contact = () => {
     setIsSubmitting(true);
     
     try {
-      const response = await createReservation(formData);
+      const response = await createReservation(formData, idempotencyKey.current);
       
       if (response.success) {
         toast.success('Demande envoyée !', {
@@ -54,6 +58,7 @@ const Contact = () => {
         });
         
         // Reset form
+        idempotencyKey.current = newIdempotencyKey();
         setFormData({
           name: '',
           email: '',
@@ -67,7 +72,7 @@ const Contact = () => {
     } catch (error) {
       console.error('Reservation error:', error);
       toast.error('Erreur lors de l\'envoi', {
-        description: 'Veuillez réessayer ou nous appeler directement.',
+        description: error.response?.data?.detail || 'Veuillez réessayer ou nous appeler directement.',
       });
     } finally {
       setIsSubmitting(false);
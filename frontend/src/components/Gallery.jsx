@@ -3,6 +3,37 @@ import { AspectRatio } from './ui/aspect-ratio';
 import { Dialog, DialogContent, DialogTrigger } from './ui/dialog';
 import { ZoomIn, Loader2 } from 'lucide-react';
 import { useData } from '../context/DataContext';
+import { mediaSrcset, mediaUrl } from '../services/api';
+
+// Rendered width of a grid cell: 3 columns from lg, 2 from sm
+const GRID_SIZES = '(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw';
+const DIALOG_SIZES = '(min-width: 896px) 896px, 100vw';
+
+// Uploaded images come with AVIF/WebP variants at several widths and a blurred placeholder;
+// seeded ones only have a src
+const ResponsiveImage = ({ image, sizes, className, loading }) => (
+  <picture>
+    {(image.sources || []).map((source) => (
+      <source key={source.type} type={source.type} srcSet={mediaSrcset(source.srcset)} sizes={sizes} />
+    ))}
+    <img
+      src={mediaUrl(image.src)}
+      srcSet={mediaSrcset(image.srcset)}
+      sizes={image.srcset ? sizes : undefined}
+      width={image.width}
+      height={image.height}
+      alt={image.alt}
+      loading={loading}
+      decoding="async"
+      className={className}
+      style={image.placeholder ? {
+        backgroundImage: `url(${image.placeholder})`,
+        backgroundSize: 'cover',
+        backgroundPosition: 'center',
+      } : undefined}
+    />
+  </picture>
+);
 
 const Gallery = () => {
   const { galleryImages, loading } = useData();
@@ -79,9 +110,10 @@ const Gallery = () => {
                   onClick={() => setSelectedImage(image)}
                 >
                   <AspectRatio ratio={index === 0 ? 16 / 12 : 4 / 3}>
-                    <img
-                      src={image.src}
-                      alt={image.alt}
+                    <ResponsiveImage
+                      image={image}
+                      sizes={GRID_SIZES}
+                      loading={index < 3 ? 'eager' : 'lazy'}
                       className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
                     />
                   </AspectRatio>
@@ -106,9 +138,9 @@ const Gallery = () => {
               </DialogTrigger>
               
               <DialogContent className="max-w-4xl p-0 overflow-hidden bg-transparent border-none">
-                <img
-                  src={image.src}
-                  alt={image.alt}
+                <ResponsiveImage
+                  image={image}
+                  sizes={DIALOG_SIZES}
                   className="w-full h-auto rounded-lg"
                 />
               </DialogContent>
@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
-import { getRestaurantInfo, getMenu, getReviews, getGallery } from '../services/api';
+import { getSiteBundle, getRestaurantInfo, getMenu, getReviews, getGallery } from '../services/api';
 import { 
   restaurantInfo as mockRestaurantInfo, 
   menuCategories as mockMenuCategories, 
@@ -37,13 +37,16 @@ export const DataProvider = ({ children }) => {
       setError(null);
       
       try {
-        // Fetch all data in parallel
-        const [restaurantData, menuData, reviewsData, galleryData] = await Promise.all([
-          getRestaurantInfo().catch(() => null),
-          getMenu().catch(() => null),
-          getReviews().catch(() => null),
-          getGallery().catch(() => null)
-        ]);
+        // Whole site in one request, falling back to the individual endpoints
+        const bundle = await getSiteBundle().catch(() => null);
+        const [restaurantData, menuData, reviewsData, galleryData] = bundle
+          ? [bundle.restaurant, bundle.menu, bundle.reviews, bundle.gallery]
+          : await Promise.all([
+              getRestaurantInfo().catch(() => null),
+              getMenu().catch(() => null),
+              getReviews().catch(() => null),
+              getGallery().catch(() => null)
+            ]);
 
         if (restaurantData) {
           // Transform backend data to match frontend expected format
@@ -88,11 +91,14 @@ export const DataProvider = ({ children }) => {
   const refreshData = async () => {
     setLoading(true);
     try {
-      const [menuData, reviewsData, galleryData] = await Promise.all([
-        getMenu().catch(() => null),
-        getReviews().catch(() => null),
-        getGallery().catch(() => null)
-      ]);
+      const bundle = await getSiteBundle().catch(() => null);
+      const [menuData, reviewsData, galleryData] = bundle
+        ? [bundle.menu, bundle.reviews, bundle.gallery]
+        : await Promise.all([
+            getMenu().catch(() => null),
+            getReviews().catch(() => null),
+            getGallery().catch(() => null)
+          ]);
 
       if (menuData) setMenuCategories(menuData);
       if (reviewsData) setReviews(reviewsData);
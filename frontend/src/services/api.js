@@ -11,6 +11,19 @@ const apiClient = axios.create({
   },
 });
 
+// ============== Site Bundle API ==============
+
+// Restaurant, menu, gallery and latest reviews in a single request
+export const getSiteBundle = async () => {
+  try {
+    const response = await apiClient.get('/site-bundle');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching site bundle:', error);
+    throw error;
+  }
+};
+
 // ============== Restaurant API ==============
 
 export const getRestaurantInfo = async () => {
@@ -35,6 +48,17 @@ export const getMenu = async () => {
   }
 };
 
+// params: { q, min_price, max_price, category, limit }
+export const searchMenu = async (params = {}) => {
+  try {
+    const response = await apiClient.get('/menu/search', { params });
+    return response.data;
+  } catch (error) {
+    console.error('Error searching menu:', error);
+    throw error;
+  }
+};
+
 export const getMenuCategory = async (categoryId) => {
   try {
     const response = await apiClient.get(`/menu/${categoryId}`);
@@ -47,9 +71,16 @@ export const getMenuCategory = async (categoryId) => {
 
 // ============== Reservations API ==============
 
-export const createReservation = async (reservationData) => {
+export const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+// Retries of the same submission must reuse its idempotencyKey so the server books it once
+export const createReservation = async (reservationData, idempotencyKey) => {
   try {
-    const response = await apiClient.post('/reservations', reservationData);
+    const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+    const response = await apiClient.post('/reservations', reservationData, { headers });
     return response.data;
   } catch (error) {
     console.error('Error creating reservation:', error);
@@ -57,10 +88,13 @@ export const createReservation = async (reservationData) => {
   }
 };
 
-export const getReservations = async () => {
+export const getReservations = async (params = {}) => {
   try {
-    const response = await apiClient.get('/reservations');
-    return response.data;
+    const response = await apiClient.get('/reservations', { params });
+    return {
+      reservations: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
   } catch (error) {
     console.error('Error fetching reservations:', error);
     throw error;
@@ -79,6 +113,16 @@ export const getReviews = async () => {
   }
 };
 
+export const getReviewStats = async () => {
+  try {
+    const response = await apiClient.get('/reviews/stats');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching review stats:', error);
+    throw error;
+  }
+};
+
 export const createReview = async (reviewData) => {
   try {
     const response = await apiClient.post('/reviews', reviewData);
@@ -111,6 +155,28 @@ export const getGalleryByCategory = async (category) => {
   }
 };
 
+// Upload an image (admin); the server answers with the stored image and its responsive variants
+export const uploadGalleryImage = async (file, alt, category) => {
+  const form = new FormData();
+  form.append('file', file);
+  form.append('alt', alt);
+  form.append('category', category);
+  try {
+    const response = await apiClient.post('/gallery', form, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error uploading gallery image:', error);
+    throw error;
+  }
+};
+
+// Uploaded images are served by the backend under /api/media: make their URLs absolute
+export const mediaUrl = (url) => (url && url.startsWith('/') ? `${BACKEND_URL}${url}` : url);
+
+export const mediaSrcset = (srcset) => srcset && srcset.split(', ').map(mediaUrl).join(', ');
+
 // ============== Health Check API ==============
 
 export const healthCheck = async () => {
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The backend modules import each other by their bare names (from cache import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py reads its settings at import; the database itself is an in-memory stand-in
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "majestea_test")
+# Every test request comes from the same address: rate limits are tested on their own
+for name in (
+    "RESERVATION_RATE_PER_MINUTE", "RESERVATION_BURST", "REVIEW_RATE_PER_MINUTE", "REVIEW_BURST",
+    "CONCURRENCY_LIMIT_READ", "CONCURRENCY_LIMIT_WRITE", "CONCURRENCY_LIMIT_ADMIN",
+):
+    os.environ.setdefault(name, "1000000")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database():
+    """A fresh mongomock-motor database, like backend_bench.py --mongomock uses"""
+    from repositories import in_memory_database
+
+    return in_memory_database(f"test_{uuid.uuid4().hex}")
+
+
+@pytest.fixture
+async def server(database):
+    """The server module bound to the in-memory database, started and ready"""
+    import server as module
+
+    module.client = database.client
+    module.bind_database(database)
+    # Module state left over from the previous test
+    module.readiness.update(dict.fromkeys(module.readiness, False))
+    module.menu_index.version = None
+    module.response_cache.invalidate()
+    await module.app.router.startup()
+    for _ in range(500):
+        if all(module.readiness.values()):
+            break
+        await asyncio.sleep(0.01)
+    try:
+        yield module
+    finally:
+        await module.app.router.shutdown()
+
+
+@pytest.fixture
+async def client(server):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api") as http:
+        yield http
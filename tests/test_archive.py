@@ -0,0 +1,115 @@
+"""
+Reservation archival to a collection or to monthly NDJSON files
+"""
+import asyncio
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+from archive import ARCHIVE_JOB, CollectionArchive, FileArchive, ReservationArchiver
+from jobs import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+TODAY = date(2026, 3, 1)
+
+
+def reservation(number: int, visit: str) -> dict:
+    return {"id": f"r{number}", "phone": f"06{number:08d}", "date": visit, "time": "19:00", "status": "confirmed"}
+
+
+@pytest.fixture
+async def reservations(database):
+    await database.reservations.insert_many([
+        reservation(1, "2024-12-31"),
+        reservation(2, "2025-01-15"),
+        reservation(3, "2025-02-27"),
+        # The cutoff itself stays
+        reservation(4, "2025-03-01"),
+        reservation(5, "2026-04-01"),
+        # Not ISO: compares wrongly as a string, left alone
+        reservation(6, "15/01/2025"),
+    ])
+    return database.reservations
+
+
+def archiver(database, store, **options):
+    return ReservationArchiver(database.reservations, store, JobQueue(database.outbox), after_days=365, **options)
+
+
+async def ids(collection):
+    return sorted([document["id"] async for document in collection.find()])
+
+
+async def test_past_reservations_move_to_the_archive_collection(database, reservations):
+    archive = archiver(database, CollectionArchive(database.reservations_archive), batch_size=2)
+    assert archive.cutoff(TODAY) == "2025-03-01"
+    assert await archive.archive(TODAY) == 3
+    assert await ids(database.reservations_archive) == ["r1", "r2", "r3"]
+    assert await ids(reservations) == ["r4", "r5", "r6"]
+    assert await archive.archive(TODAY) == 0
+
+
+async def test_a_run_interrupted_before_its_delete_can_be_resumed(database, reservations):
+    # The previous run copied r1 but died before deleting it from the hot collection
+    await database.reservations_archive.create_index("id", unique=True)
+    await database.reservations_archive.insert_one(await reservations.find_one({"id": "r1"}))
+    archive = archiver(database, CollectionArchive(database.reservations_archive))
+    assert await archive.archive(TODAY) == 3
+    assert await ids(database.reservations_archive) == ["r1", "r2", "r3"]
+
+
+async def test_archival_is_off_with_a_zero_horizon(database, reservations):
+    store = CollectionArchive(database.reservations_archive)
+    archive = ReservationArchiver(reservations, store, JobQueue(database.outbox), after_days=0)
+    assert not archive.enabled
+    assert await archive.archive(TODAY) == 0
+    archive.start()
+    assert archive._task is None
+    assert await reservations.count_documents({}) == 6
+
+
+async def test_file_archives_hold_one_gzipped_stream_per_month(database, reservations, tmp_path):
+    archive = archiver(database, FileArchive(str(tmp_path)), batch_size=2)
+    assert await archive.archive(TODAY) == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "reservations-2024-12.ndjson.gz", "reservations-2025-01.ndjson.gz", "reservations-2025-02.ndjson.gz",
+    ]
+    # A later run appends a gzip member, read back as one stream
+    await reservations.insert_one(reservation(7, "2025-01-20"))
+    assert await archive.archive(TODAY) == 1
+    with gzip.open(tmp_path / "reservations-2025-01.ndjson.gz") as lines:
+        archived = [json.loads(line) for line in lines]
+    assert [document["id"] for document in archived] == ["r2", "r7"]
+    assert "_id" not in archived[0]
+
+
+async def test_every_process_schedules_the_same_job_once(database):
+    first = archiver(database, CollectionArchive(database.reservations_archive), interval=3600)
+    second = archiver(database, CollectionArchive(database.reservations_archive), interval=3600)
+    first.start()
+    second.start()
+    try:
+        await asyncio.sleep(0.05)
+    finally:
+        await first.stop()
+        await second.stop()
+    jobs = await database.outbox.find().to_list(None)
+    assert [job["kind"] for job in jobs] == [ARCHIVE_JOB]
+    assert jobs[0]["_id"].startswith(f"{ARCHIVE_JOB}:")
+
+
+async def test_archived_reservations_are_found_on_request(client, database):
+    await database.reservations_archive.insert_one(reservation(1, "2024-12-31"))
+    assert (await client.get("/reservations/r1")).status_code == 404
+    response = await client.get("/reservations/r1", params={"include_archived": "true"})
+    assert response.status_code == 200
+    assert response.json()["date"] == "2024-12-31"
+
+
+async def test_file_archives_cannot_be_queried(client, server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server.reservation_archiver, "store", FileArchive(str(tmp_path)))
+    response = await client.get("/reservations", params={"include_archived": "true"})
+    assert response.status_code == 400
@@ -0,0 +1,87 @@
+"""
+Slot availability: the occupancy counters and the reservation routes using them
+"""
+import asyncio
+
+import pytest
+
+from availability import AvailabilityService, Capacity, Slot, SlotError, party_size
+
+pytestmark = pytest.mark.anyio
+
+HOURS = {"monday": {"open": "12:00", "close": "14:00"}}
+MONDAY = "2026-03-02"
+
+
+@pytest.fixture
+def service(database):
+    return AvailabilityService(database.slot_occupancy, HOURS, Capacity(tables=3, seats_per_table=4, seats=10))
+
+
+def test_requested_times_fall_into_their_slot(service):
+    assert service.slots_for(MONDAY) == ["12:00", "12:30", "13:00", "13:30"]
+    assert service.slot_for(MONDAY, "13:45") == Slot(MONDAY, "13:30")
+    assert service.slots_for("2026-03-03") == []
+    for day, time in ((MONDAY, "14:00"), (MONDAY, "11:59"), ("2026-03-03", "12:00"), ("02/03/2026", "12:00"), (MONDAY, "midi")):
+        with pytest.raises(SlotError):
+            service.slot_for(day, time)
+
+
+def test_party_size_reads_the_free_text_field():
+    assert [party_size(guests) for guests in ("2", "8+", " 4 personnes")] == [2, 8, 4]
+    for guests in ("", "deux", "0"):
+        with pytest.raises(SlotError):
+            party_size(guests)
+
+
+async def test_concurrent_bookings_never_go_over_capacity(service):
+    slot = service.slot_for(MONDAY, "12:00")
+    booked = await asyncio.gather(*(service.reserve(slot, 2) for _ in range(6)))
+    assert booked.count(True) == 3
+    assert not await service.reserve(slot, 1)
+    day = await service.day(MONDAY, 2)
+    assert day["slots"][0] == {"time": "12:00", "tables_left": 0, "seats_left": 4, "available": False}
+    assert day["slots"][1]["available"]
+
+    await service.release(slot, 2)
+    assert await service.reserve(slot, 2)
+
+
+async def test_seats_limit_parties_even_with_tables_left(service):
+    slot = service.slot_for(MONDAY, "13:00")
+    assert await service.reserve(slot, 8)
+    assert not await service.reserve(slot, 3)
+    assert await service.reserve(slot, 2)
+    # Larger than the whole room
+    assert not await service.reserve(service.slot_for(MONDAY, "12:00"), 11)
+
+
+async def test_rebuild_counts_only_active_reservations(service, database):
+    await database.reservations.insert_many([
+        {"date": MONDAY, "time": "12:10", "guests": "2", "status": "pending"},
+        {"date": MONDAY, "time": "12:20", "guests": "5", "status": "confirmed"},
+        {"date": MONDAY, "time": "12:15", "guests": "4", "status": "cancelled"},
+        {"date": "bientôt", "time": "12:00", "guests": "2", "status": "pending"},
+    ])
+    assert await service.rebuild(database.reservations) == 2
+    slot = (await service.day(MONDAY))["slots"][0]
+    assert (slot["tables_left"], slot["seats_left"]) == (0, 3)
+
+
+async def test_full_slots_are_refused_and_cancelling_frees_them(client, server, monkeypatch):
+    monkeypatch.setattr(server.availability, "capacity", Capacity(tables=1, seats_per_table=4, seats=4))
+    booking = {"name": "Lina", "phone": "0600000001", "date": MONDAY, "time": "12:00", "guests": "4"}
+    first = await client.post("/reservations", json=booking)
+    assert first.status_code == 201
+    full = await client.post("/reservations", json=dict(booking, phone="0600000002"))
+    assert full.status_code == 409
+    slots = (await client.get("/availability", params={"date": MONDAY})).json()["slots"]
+    assert [slot["available"] for slot in slots if slot["time"] == "12:00"] == [False]
+
+    reservation_id = first.json()["reservation"]["id"]
+    response = await client.patch(f"/reservations/{reservation_id}/status", params={"status": "cancelled"})
+    assert response.status_code == 200
+    assert (await client.post("/reservations", json=dict(booking, phone="0600000002"))).status_code == 201
+    # Nothing left to reactivate the cancelled booking into
+    response = await client.patch(f"/reservations/{reservation_id}/status", params={"status": "confirmed"})
+    assert response.status_code == 409
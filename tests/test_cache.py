@@ -0,0 +1,90 @@
+"""
+Response cache: invalidation racing with loads, TTL and validators
+"""
+import asyncio
+
+import pytest
+
+from cache import ResponseCache
+from metrics import RESPONSE_CACHE_LOOKUPS
+
+pytestmark = pytest.mark.anyio
+
+
+class HeldLoader:
+    """Loader returning the current value of data once released"""
+
+    def __init__(self, data):
+        self.data = data
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started.set()
+        await self.release.wait()
+        return self.data
+
+
+async def load_across(cache, namespace, invalidated):
+    loader = HeldLoader({"v": "old"})
+    task = asyncio.create_task(cache.get_or_load(namespace, "", loader))
+    await loader.started.wait()
+    cache.invalidate(invalidated)
+    loader.release.set()
+    return await task
+
+
+async def test_a_load_overtaken_by_an_invalidation_is_not_stored():
+    cache = ResponseCache()
+    response = await load_across(cache, "menu", "menu")
+    # Its caller still gets what was read
+    assert response.body == b'{"v":"old"}'
+    assert cache.get("menu") is None
+
+
+async def test_a_full_invalidation_also_discards_the_load():
+    cache = ResponseCache()
+    await load_across(cache, "menu", None)
+    assert cache.get("menu") is None
+
+
+async def test_invalidating_another_namespace_keeps_the_load():
+    cache = ResponseCache()
+    await load_across(cache, "menu", "reviews")
+    assert cache.get("menu").body == b'{"v":"old"}'
+
+
+async def test_entries_expire_after_their_ttl():
+    cache = ResponseCache(ttl=0.0)
+    cache.set("menu", "", b"[]")
+    assert cache.get("menu") is None
+
+
+async def test_an_unchanged_body_keeps_its_last_modified():
+    cache = ResponseCache()
+    first = cache.set("menu", "", b"[1]")
+    await asyncio.sleep(1.01)
+    assert cache.set("menu", "", b"[1]").last_modified == first.last_modified
+    changed = cache.set("menu", "", b"[2]")
+    assert changed.etag != first.etag
+
+
+async def test_least_recently_used_entries_are_evicted_first():
+    cache = ResponseCache(max_entries=2)
+    cache.set("menu", "a", b"a")
+    cache.set("menu", "b", b"b")
+    cache.get("menu", "a")
+    cache.set("menu", "c", b"c")
+    assert cache.get("menu", "b") is None
+    assert cache.get("menu", "a").body == b"a"
+
+
+async def test_lookups_are_exposed_as_a_counter(client):
+    before = RESPONSE_CACHE_LOOKUPS.values()
+    await client.get("/restaurant")
+    await client.get("/restaurant")
+    after = RESPONSE_CACHE_LOOKUPS.values()
+    assert after[("hit",)] - before.get(("hit",), 0) >= 1
+    metrics = (await client.get("/metrics")).text
+    assert "# TYPE response_cache_lookups_total counter" in metrics
+    assert 'response_cache_lookups_total{result="miss"}' in metrics
@@ -0,0 +1,167 @@
+"""
+Single-flight coalescing of catalog loads and its interplay with cache invalidation
+"""
+import asyncio
+
+import pytest
+
+from cache import ResponseCache
+from coalescing import SingleFlight
+from metrics import COALESCED_READS
+
+
+class Loader:
+    """Loader returning its successive call numbers, each held until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gates = []
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        gate = asyncio.Event()
+        self.gates.append(gate)
+        await gate.wait()
+        return {"v": call}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = ResponseCache(flights=SingleFlight())
+        loader = Loader()
+        before = COALESCED_READS.values().get(("menu",), 0)
+        requests = [asyncio.create_task(cache.get_or_load("menu", "", loader)) for _ in range(10)]
+        await settle()
+        loader.gates[0].set()
+        responses = await asyncio.gather(*requests)
+        assert loader.calls == 1
+        assert {response.body for response in responses} == {b'{"v":1}'}
+        assert COALESCED_READS.values()[("menu",)] - before == 9
+        assert cache.flights.in_flight() == 0
+
+    run(scenario())
+
+
+def test_namespaces_not_configured_are_not_coalesced():
+    async def scenario():
+        cache = ResponseCache(flights=SingleFlight(["menu"]))
+        loader = Loader()
+        requests = [asyncio.create_task(cache.get_or_load("reviews", "", loader)) for _ in range(3)]
+        await settle()
+        for gate in loader.gates:
+            gate.set()
+        await asyncio.gather(*requests)
+        assert loader.calls == 3
+
+    run(scenario())
+
+
+def test_failure_reaches_every_caller_and_is_not_remembered():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("down")
+
+        results = await asyncio.gather(*(flights.do("menu", "", failing) for _ in range(3)), return_exceptions=True)
+        assert calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await flights.do("menu", "", failing)
+        assert calls == 2
+
+    run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    async def scenario():
+        flights = SingleFlight()
+        loader = Loader()
+        first = asyncio.create_task(flights.do("menu", "", loader))
+        second = asyncio.create_task(flights.do("menu", "", loader))
+        await settle()
+        first.cancel()
+        await settle()
+        loader.gates[0].set()
+        assert await second == {"v": 1}
+        assert first.cancelled()
+
+    run(scenario())
+
+
+def test_invalidation_during_a_load_starts_a_fresh_one():
+    async def scenario():
+        cache = ResponseCache(flights=SingleFlight())
+        loader = Loader()
+        stale = asyncio.create_task(cache.get_or_load("menu", "", loader))
+        await settle()
+        cache.invalidate("menu")
+        fresh = asyncio.create_task(cache.get_or_load("menu", "", loader))
+        await settle()
+        assert loader.calls == 2
+
+        # The fresh load lands first, then the one that read before the change
+        loader.gates[1].set()
+        assert (await fresh).body == b'{"v":2}'
+        loader.gates[0].set()
+        assert (await stale).body == b'{"v":1}'
+        assert cache.get("menu", "").body == b'{"v":2}'
+
+    run(scenario())
+
+
+def test_load_finishing_after_an_invalidation_is_not_cached():
+    async def scenario():
+        for flights in (None, SingleFlight()):
+            cache = ResponseCache(flights=flights)
+            loader = Loader()
+            request = asyncio.create_task(cache.get_or_load("menu", "", loader))
+            await settle()
+            cache.invalidate("menu")
+            loader.gates[0].set()
+            assert (await request).body == b'{"v":1}'
+            assert cache.get("menu", "") is None
+
+    run(scenario())
+
+
+def test_full_invalidation_applies_to_every_namespace():
+    async def scenario():
+        cache = ResponseCache(flights=SingleFlight())
+        loader = Loader()
+        request = asyncio.create_task(cache.get_or_load("gallery", "", loader))
+        await settle()
+        cache.invalidate()
+        loader.gates[0].set()
+        await request
+        assert cache.get("gallery", "") is None
+
+    run(scenario())
+
+
+def test_other_namespaces_keep_their_loads():
+    async def scenario():
+        cache = ResponseCache(flights=SingleFlight())
+        loader = Loader()
+        request = asyncio.create_task(cache.get_or_load("gallery", "", loader))
+        await settle()
+        cache.invalidate("menu")
+        loader.gates[0].set()
+        await request
+        assert cache.get("gallery", "").body == b'{"v":1}'
+
+    run(scenario())
@@ -0,0 +1,109 @@
+"""
+Response compression: negotiation, the precompressed body cache and revalidation
+"""
+import gzip
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+
+import compression
+from compression import CompressionMiddleware, negotiate_encoding
+
+pytestmark = pytest.mark.anyio
+
+BODY = b'{"items": "' + b"the vert " * 400 + b'"}'
+
+
+def test_negotiation_follows_the_server_preference_and_q_values():
+    available = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", available) == "br"
+    assert negotiate_encoding("br;q=0, gzip", available) == "gzip"
+    assert negotiate_encoding("*", available) == "zstd"
+    assert negotiate_encoding("*, zstd;q=0, br;q=0", available) == "gzip"
+    assert negotiate_encoding(None, available) == "identity"
+
+
+def compressed_app(**options):
+    app = FastAPI()
+
+    @app.get("/body")
+    async def body():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(b"{}", media_type="application/json")
+
+    @app.get("/image")
+    async def image():
+        return Response(BODY, media_type="image/webp")
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for _ in range(3):
+                yield BODY + b"\n"
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    return CompressionMiddleware(app, **options)
+
+
+async def get(app, path, coding="gzip"):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers={"Accept-Encoding": coding})
+
+
+async def test_bodies_are_compressed_once_per_etag_and_coding(monkeypatch):
+    calls = []
+    original = compression.compress
+
+    def counted(body, coding, level):
+        calls.append(coding)
+        return original(body, coding, level)
+
+    monkeypatch.setattr(compression, "compress", counted)
+    app = compressed_app(encodings=["gzip"])
+    for _ in range(3):
+        response = await get(app, "/body")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == 'W/"v1"'
+        assert "accept-encoding" in response.headers["vary"].lower()
+        assert response.content == BODY
+    assert calls == ["gzip"]
+
+
+async def test_small_and_binary_bodies_are_left_alone():
+    app = compressed_app(encodings=["gzip"])
+    for path in ("/small", "/image"):
+        response = await get(app, path)
+        assert "content-encoding" not in response.headers
+    assert (await get(app, "/body", coding="identity")).headers.get("content-encoding") is None
+
+
+async def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    app = compressed_app(encodings=["gzip"])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert gzip.decompress(raw) == (BODY + b"\n") * 3
+    # Every chunk is flushed, so the first rows decode without the end of the stream
+    assert zlib.decompressobj(31).decompress(raw[:-10]).startswith(BODY)
+
+
+async def test_compressed_catalog_responses_revalidate_with_their_weak_etag(client):
+    response = await client.get("/menu", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+
+    revalidated = await client.get("/menu", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert "content-encoding" not in revalidated.headers
@@ -0,0 +1,48 @@
+"""
+Validators on the catalog endpoints: ETag, Last-Modified and 304 answers
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_catalog_responses_carry_validators(client, server):
+    response = await client.get("/menu", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["last-modified"]
+    assert response.headers["cache-control"] == server.settings.CATALOG_CACHE_CONTROL
+
+
+async def test_current_copies_get_a_304(client):
+    first = await client.get("/restaurant")
+    etag = first.headers["etag"]
+
+    response = await client.get("/restaurant", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    # Weak comparison, lists and the wildcard
+    for header in (f"W/{etag}", f'"other", {etag}', "*"):
+        assert (await client.get("/restaurant", headers={"If-None-Match": header})).status_code == 304
+    assert (await client.get("/restaurant", headers={"If-None-Match": '"other"'})).status_code == 200
+
+    since = {"If-Modified-Since": first.headers["last-modified"]}
+    assert (await client.get("/restaurant", headers=since)).status_code == 304
+    # If-None-Match wins over If-Modified-Since
+    both = dict(since, **{"If-None-Match": '"other"'})
+    assert (await client.get("/restaurant", headers=both)).status_code == 200
+
+
+async def test_a_write_changes_the_etag(client):
+    before = await client.get("/menu")
+    category = before.json()[0]["id"]
+    response = await client.post("/menu/items", json={
+        "name": "Thé kumquat", "price": 4.5, "description": "", "category_id": category,
+    })
+    assert response.status_code == 201
+
+    after = await client.get("/menu", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert "kumquat" in after.text
@@ -0,0 +1,95 @@
+"""
+Gallery uploads: size limits, decompression limits and the image process pool
+"""
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+from images import ImageError, ImagePipeline, render_variants  # noqa: E402
+from limits import BodySizeLimitMiddleware  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_images_over_the_pixel_limit_are_refused_before_decoding(tmp_path):
+    # Pillow itself only refuses more than twice MAX_IMAGE_PIXELS
+    with pytest.raises(ImageError):
+        render_variants(png(150, 100), str(tmp_path), "big", [64], ["webp"], 75, max_pixels=10_000)
+    assert list(tmp_path.iterdir()) == []
+    rendered = render_variants(png(100, 100), str(tmp_path), "ok", [64], ["webp"], 75, max_pixels=10_000)
+    assert [variant["width"] for variant in rendered["variants"]] == [64]
+
+
+def limited_app(limit: int):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    return BodySizeLimitMiddleware(app, {"/upload": limit})
+
+
+async def test_body_size_limit_uses_content_length():
+    transport = httpx.ASGITransport(app=limited_app(10))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.post("/upload", content=b"x" * 10)).json() == {"size": 10}
+        assert (await client.post("/upload", content=b"x" * 11)).status_code == 413
+
+
+async def test_body_size_limit_stops_chunked_uploads():
+    async def chunks():
+        for _ in range(5):
+            yield b"x" * 4
+
+    transport = httpx.ASGITransport(app=limited_app(10))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/upload", content=chunks())
+    assert response.status_code == 413
+
+
+async def test_upload_route_refuses_oversized_bodies(client, server, monkeypatch):
+    limit = server.settings.GALLERY_MAX_UPLOAD_BYTES + 64 * 1024
+    response = await client.post(
+        "/gallery",
+        content=b"x",
+        headers={"content-type": "multipart/form-data; boundary=x", "content-length": str(limit + 1)},
+    )
+    assert response.status_code == 413
+
+
+async def test_upload_answers_503_and_recovers_when_a_worker_dies(client, server, monkeypatch):
+    async def broken(data):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(server.image_pipeline, "process", broken)
+    response = await client.post(
+        "/gallery", files={"file": ("a.png", png(40, 30), "image/png")}, data={"alt": "Thé", "category": "salle"},
+    )
+    assert response.status_code == 503
+
+
+async def test_pipeline_starts_a_fresh_pool_after_a_worker_died(tmp_path):
+    pipeline = ImagePipeline(tmp_path / "variants", tmp_path / "originals", "/media", widths=[32], formats=["webp"], workers=1)
+    try:
+        assert (await pipeline.process(png(40, 30)))["width"] == 40
+        for process in list(pipeline._pool._processes.values()):
+            process.kill()
+            process.join()
+        with pytest.raises(BrokenProcessPool):
+            await pipeline.process(png(41, 30))
+        assert (await pipeline.process(png(42, 30)))["width"] == 42
+    finally:
+        pipeline.stop()
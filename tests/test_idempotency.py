@@ -0,0 +1,109 @@
+"""
+Idempotent reservation creation and duplicate booking detection
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore, StoredResponse, fingerprint
+from indexes import INDEXES, ensure_indexes
+from repositories import Repositories
+
+pytestmark = pytest.mark.anyio
+
+BOOKING = {"name": "Lina", "phone": "0600000001", "date": "2026-03-02", "time": "19:00", "guests": "2"}
+
+
+@pytest.fixture
+def store(database):
+    return IdempotencyStore(database.idempotency_keys)
+
+
+async def test_a_completed_key_replays_its_response(store):
+    digest = fingerprint(BOOKING)
+    assert await store.begin("reservations", "k1", digest) is None
+    with pytest.raises(IdempotencyConflict) as running:
+        await store.begin("reservations", "k1", digest)
+    assert running.value.in_progress
+
+    await store.complete("reservations", "k1", 201, b'{"ok":true}')
+    assert await store.begin("reservations", "k1", digest) == StoredResponse(201, b'{"ok":true}')
+    # Keys are scoped
+    assert await store.begin("reviews", "k1", digest) is None
+
+
+async def test_a_key_reused_for_another_request_is_refused(store):
+    await store.begin("reservations", "k1", fingerprint(BOOKING))
+    with pytest.raises(IdempotencyConflict) as reused:
+        await store.begin("reservations", "k1", fingerprint(dict(BOOKING, guests="3")))
+    assert not reused.value.in_progress
+    with pytest.raises(ValueError):
+        await store.begin("reservations", "k" * 256, fingerprint(BOOKING))
+
+
+async def test_abandoned_and_stale_claims_can_be_retried(store, database):
+    digest = fingerprint(BOOKING)
+    await store.begin("reservations", "k1", digest)
+    await store.abandon("reservations", "k1")
+    assert await store.begin("reservations", "k1", digest) is None
+    # Its request died without completing: once the lock has expired, a retry takes over
+    await database.idempotency_keys.update_one(
+        {"_id": "reservations:k1"}, {"$set": {"created_at": datetime.utcnow() - timedelta(seconds=60)}},
+    )
+    assert await store.begin("reservations", "k1", digest) is None
+
+
+async def test_retries_with_the_same_key_book_once(client, database):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = await client.post("/reservations", json=BOOKING, headers=headers)
+    assert first.status_code == 201
+    retry = await client.post("/reservations", json=BOOKING, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert await database.reservations.count_documents({}) == 1
+
+    changed = await client.post("/reservations", json=dict(BOOKING, guests="4"), headers=headers)
+    assert changed.status_code == 422
+
+
+async def test_duplicate_bookings_are_a_409(client, database):
+    await ensure_indexes(database)
+    assert (await client.post("/reservations", json=BOOKING)).status_code == 201
+    duplicate = await client.post("/reservations", json=dict(BOOKING, name="Lina B."))
+    assert duplicate.status_code == 409
+    assert await database.reservations.count_documents({}) == 1
+    # The seats taken by the refused booking were given back
+    slots = (await client.get("/availability", params={"date": BOOKING["date"]})).json()["slots"]
+    assert [slot["seats_left"] for slot in slots if slot["time"] == "19:00"] == [46]
+
+    # A client error is final: a retry with the same key gets the same 409
+    headers = {"Idempotency-Key": "duplicate-1"}
+    assert (await client.post("/reservations", json=BOOKING, headers=headers)).status_code == 409
+    replayed = await client.post("/reservations", json=BOOKING, headers=headers)
+    assert (replayed.status_code, replayed.headers.get("idempotent-replayed")) == (409, "true")
+
+
+def test_the_unique_index_only_covers_active_reservations():
+    # mongomock ignores partial filters: the filter itself is checked here
+    (index,) = [model.document for model in INDEXES["reservations"] if model.document["name"] == "phone_date_time_active_unique"]
+    assert index["unique"]
+    assert index["partialFilterExpression"] == {"active": True}
+
+
+async def test_cancelling_clears_the_active_flag(client, database):
+    reservation = (await client.post("/reservations", json=BOOKING)).json()["reservation"]
+    await client.patch(f"/reservations/{reservation['id']}/status", params={"status": "cancelled"})
+    assert (await database.reservations.find_one({"id": reservation["id"]}))["active"] is False
+
+
+async def test_existing_duplicates_are_flagged_before_the_index_is_built(database):
+    older = dict(BOOKING, id="a", status="pending", created_at=1)
+    newer = dict(BOOKING, id="b", status="confirmed", created_at=2)
+    cancelled = dict(BOOKING, id="c", status="cancelled", created_at=3)
+    other = dict(BOOKING, id="d", status="pending", created_at=1, time="20:00")
+    await database.reservations.insert_many([older, newer, cancelled, other])
+
+    await Repositories(database).reservations.backfill_active(["pending", "confirmed"])
+    active = {document["id"]: document["active"] async for document in database.reservations.find()}
+    assert active == {"a": False, "b": True, "c": False, "d": True}
@@ -0,0 +1,155 @@
+"""
+Outbox job queue: delivery, retries, claims and shutdown
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from jobs import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if await condition():
+            return True
+        await asyncio.sleep(0.01)
+    return await condition()
+
+
+def states(queue, **expected):
+    async def condition():
+        return await queue.stats() == dict({"pending": 0, "running": 0, "done": 0, "failed": 0}, **expected)
+    return condition
+
+
+@pytest.fixture
+async def queue(database):
+    jobs = JobQueue(database.outbox, workers=2, backoff_seconds=0.01, max_backoff_seconds=0.02, poll_interval=0.05)
+    yield jobs
+    await jobs.stop()
+
+
+async def test_enqueued_jobs_run_once(queue):
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload["n"])
+
+    queue.register("note", handler)
+    queue.start()
+    for n in range(5):
+        await queue.enqueue("note", {"n": n})
+    assert await eventually(states(queue, done=5))
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+
+
+async def test_failing_jobs_are_retried_then_left_failed(queue):
+    attempts = {"flaky": 0, "broken": 0}
+    repaired = False
+
+    async def handler(payload):
+        attempts[payload["name"]] += 1
+        if (payload["name"] == "broken" and not repaired) or attempts["flaky"] < 3:
+            raise RuntimeError("SMTP unavailable")
+
+    queue.max_attempts = 3
+    queue.register("mail", handler)
+    queue.start()
+    await queue.enqueue("mail", {"name": "flaky"})
+    await queue.enqueue("mail", {"name": "broken"})
+    assert await eventually(states(queue, done=1, failed=1))
+    assert attempts == {"flaky": 3, "broken": 3}
+    failed = await queue.collection.find_one({"state": "failed"})
+    assert failed["last_error"] == "RuntimeError: SMTP unavailable"
+
+    repaired = True
+    assert await queue.requeue_failed() == 1
+    assert await eventually(states(queue, done=2))
+
+
+async def test_jobs_without_a_handler_fail_at_once(queue):
+    queue.start()
+    await queue.enqueue("unknown", {})
+    assert await eventually(states(queue, failed=1))
+    assert (await queue.collection.find_one({}))["attempts"] == 1
+
+
+async def test_keyed_jobs_are_enqueued_once(queue):
+    assert await queue.enqueue_once("archive:1", "archive", {})
+    assert not await queue.enqueue_once("archive:1", "archive", {})
+    assert await queue.enqueue_once("archive:2", "archive", {})
+    assert await queue.collection.count_documents({}) == 2
+
+
+async def test_claims_of_dead_workers_expire(queue):
+    ran = []
+
+    async def handler(payload):
+        ran.append(payload)
+
+    queue.register("note", handler)
+    now = datetime.utcnow()
+    await queue.collection.insert_many([
+        {"kind": "note", "payload": {"n": "expired"}, "state": "running", "attempts": 1, "run_at": now,
+         "locked_until": now - timedelta(seconds=1)},
+        {"kind": "note", "payload": {"n": "held"}, "state": "running", "attempts": 1, "run_at": now,
+         "locked_until": now + timedelta(minutes=5)},
+    ])
+    queue.start()
+    assert await eventually(states(queue, done=1, running=1))
+    assert ran == [{"n": "expired"}]
+
+
+async def test_workers_survive_an_outcome_that_cannot_be_recorded(queue):
+    ran = []
+
+    async def handler(payload):
+        ran.append(payload["n"])
+
+    collection = queue.collection
+    outages = [AutoReconnect("primary stepped down")]
+
+    class Flaky:
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+        async def update_one(self, *args, **kwargs):
+            if outages:
+                raise outages.pop()
+            return await collection.update_one(*args, **kwargs)
+
+    queue.collection = Flaky()
+    queue.lock_seconds = 0.05
+    queue.register("note", handler)
+    queue.start()
+    await queue.enqueue("note", {"n": 1})
+    # The first run was not recorded: the job runs again once its claim expires
+    assert await eventually(states(queue, done=1))
+    assert ran == [1, 1]
+    await queue.enqueue("note", {"n": 2})
+    assert await eventually(states(queue, done=2))
+
+
+async def test_stop_returns_while_jobs_are_being_enqueued(queue):
+    async def handler(payload):
+        await asyncio.sleep(0)
+
+    queue.register("note", handler)
+    queue.start()
+    for n in range(20):
+        await queue.enqueue("note", {"n": n})
+    await asyncio.wait_for(queue.stop(), 2.0)
+    assert queue._tasks == []
+
+
+async def test_new_reservations_enqueue_their_notification(client, database):
+    response = await client.post("/reservations", json={
+        "name": "Lina", "phone": "0600000001", "date": "2026-03-02", "time": "19:00", "guests": "2",
+    })
+    assert response.status_code == 201
+    job = await database.outbox.find_one({"kind": "reservation_created"})
+    assert job["payload"]["reservation"]["id"] == response.json()["reservation"]["id"]
@@ -0,0 +1,81 @@
+"""
+Menu writes and the search index, in this process and as seen from another worker
+"""
+import asyncio
+
+import pytest
+
+from cache import COLLECTION_NAMESPACES
+from repositories import Repositories
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def found(server, query):
+    return [item["id"] for item in server.menu_index.search(query)["items"]]
+
+
+async def test_admin_write_updates_the_index_and_version(server, client):
+    category = (await client.get("/menu")).json()[0]["id"]
+    response = await client.post("/menu/items", json={
+        "name": "Thé kumquat", "price": 4.5, "description": "Infusion du jour", "category_id": category,
+    })
+    assert response.status_code == 201
+    item = response.json()["item"]
+    assert found(server, "kumquat") == [item["id"]]
+    assert server.menu_index.version == (await client.get("/menu/version")).json()["version"] == 1
+
+    response = await client.patch(f"/menu/items/{item['id']}", json={"price": None})
+    assert response.status_code == 422
+    response = await client.patch(f"/menu/items/{item['id']}", json={"name": "Thé yuzu"})
+    assert response.status_code == 200
+    assert found(server, "kumquat") == []
+    assert found(server, "yuzu") == [item["id"]]
+
+    assert (await client.delete(f"/menu/items/{item['id']}")).status_code == 200
+    assert found(server, "yuzu") == []
+
+
+async def test_write_from_another_worker_reaches_the_index(server, database):
+    """
+    Another worker writes the menu, then bumps the version; this worker hears about the
+    menu_categories change first, while the version it reads is still the old one.
+    """
+    assert COLLECTION_NAMESPACES["catalog_versions"] == "menu"
+    other_worker = Repositories(database).menu
+    category = (await other_worker.categories())[0]["id"]
+    version = server.menu_index.version
+
+    await other_worker.add_item({
+        "id": "kumquat", "name": "Thé kumquat", "price": 4.5, "description": "", "category_id": category,
+    })
+    # What the change stream (or the invalidation bus) does for the menu_categories change
+    server.response_cache.invalidate(COLLECTION_NAMESPACES["menu_categories"])
+    assert await eventually(lambda: found(server, "kumquat") == ["kumquat"])
+
+    new_version = await other_worker.bump_version()
+    server.response_cache.invalidate(COLLECTION_NAMESPACES["catalog_versions"])
+    assert await eventually(lambda: server.menu_index.version == new_version == version + 1)
+    assert found(server, "kumquat") == ["kumquat"]
+
+
+def test_items_stored_without_a_name_or_a_price_do_not_break_search():
+    from menu_search import MenuIndex
+
+    index = MenuIndex()
+    index.build([{"id": "c", "name": "Thés", "items": [
+        {"id": "a", "name": "Thé vert", "price": 3, "description": "vert"},
+        {"id": "b", "price": 5, "description": "vert intense"},
+        {"id": "c", "name": "Thé noir", "price": None},
+        {"name": "Sans id", "price": 2},
+    ]}], version=1)
+    assert sorted(item["id"] for item in index.search("vert")["items"]) == ["a", "b"]
+    assert "c" not in index.items
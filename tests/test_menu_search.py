@@ -0,0 +1,98 @@
+"""
+Menu search index: matching, ranking, facets and incremental updates
+"""
+import pytest
+
+from menu_search import MenuIndex, fold, tokenize
+
+pytestmark = pytest.mark.anyio
+
+CATEGORIES = [
+    {"id": "tea", "name": "Thés", "items": [
+        {"id": "t1", "name": "Thé vert jasmin", "price": 4.0, "description": "Fleurs de jasmin"},
+        {"id": "t2", "name": "Thé noir", "price": 3.5, "description": "Notes de thé vert fumé"},
+        {"id": "t3", "name": "Rooibos crème brûlée", "price": 4.5, "description": "Sans théine"},
+    ]},
+    {"id": "desserts", "name": "Desserts", "items": [
+        {"id": "d1", "name": "Crème brûlée", "price": 6.0, "description": "Vanille de Madagascar"},
+        {"id": "d2", "name": "Bœuf... non, moelleux", "price": 5.0, "description": "Chocolat et thé matcha"},
+    ]},
+]
+
+
+def ids(result):
+    return [item["id"] for item in result["items"]]
+
+
+@pytest.fixture
+def index():
+    menu = MenuIndex()
+    menu.build(CATEGORIES, version=1)
+    return menu
+
+
+def test_folding_ignores_case_accents_and_ligatures():
+    assert fold("Bœuf CRÈME Brûlée") == "boeuf creme brulee"
+    assert tokenize("Thé vert, 4€") == ["the", "vert", "4"]
+
+
+def test_every_word_must_match_the_last_as_a_prefix(index):
+    assert ids(index.search("creme brul")) == ["t3", "d1"]
+    assert ids(index.search("the ver")) == ["t1", "t2"]
+    # Only the last word is a prefix
+    assert ids(index.search("th vert")) == []
+    assert ids(index.search("boeuf")) == ["d2"]
+
+
+def test_name_matches_rank_first_then_cheaper_items(index):
+    # t1 has "vert" in its name; t2 only in its description, although cheaper
+    assert ids(index.search("vert")) == ["t1", "t2"]
+    assert ids(index.search("creme")) == ["t3", "d1"]
+    assert ids(index.search("")) == ["t2", "t1", "t3", "d2", "d1"]
+
+
+def test_price_range_and_category_facets(index):
+    result = index.search("", min_price=4.0, max_price=5.0)
+    assert ids(result) == ["t1", "t3", "d2"]
+    assert result["facets"]["price"] == {"min": 4.0, "max": 5.0}
+
+    result = index.search("the", category="desserts")
+    assert ids(result) == ["d2"]
+    # Facet counts ignore the category filter; "the" is a prefix of "theine" too
+    assert {facet["id"]: facet["count"] for facet in result["facets"]["categories"]} == {"tea": 3, "desserts": 1}
+    assert index.search("introuvable")["facets"]["price"] is None
+
+
+def test_incremental_updates_match_a_fresh_build(index):
+    index.upsert_item({"id": "t4", "name": "Thé blanc", "price": 7.0, "description": "Pai mu tan"}, "tea")
+    index.upsert_item({"id": "t1", "name": "Thé vert sencha", "price": 4.2, "description": ""}, "tea")
+    index.remove_item("t2")
+    index.remove_item("missing")
+
+    categories = [dict(category, items=[dict(item) for item in category["items"]]) for category in CATEGORIES]
+    tea = categories[0]["items"]
+    tea[:] = [item for item in tea if item["id"] != "t2"]
+    tea[0] = {"id": "t1", "name": "Thé vert sencha", "price": 4.2, "description": ""}
+    tea.append({"id": "t4", "name": "Thé blanc", "price": 7.0, "description": "Pai mu tan"})
+    fresh = MenuIndex()
+    fresh.build(categories)
+
+    for query in ("", "the", "jasmin", "sen", "pai mu", "noir", "fume", "blanc"):
+        assert index.search(query) == fresh.search(query), query
+    assert index._vocabulary == fresh._vocabulary
+    assert index._prices == fresh._prices
+
+
+def test_removing_a_category_drops_its_items(index):
+    index.remove_category("desserts")
+    assert ids(index.search("")) == ["t2", "t1", "t3"]
+    assert "matcha" not in index._vocabulary
+
+
+async def test_search_endpoint(client):
+    response = await client.get("/menu/search", params={"q": "zzzz"})
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+    everything = (await client.get("/menu/search", params={"limit": 200})).json()
+    assert everything["count"] == sum(len(category["items"]) for category in (await client.get("/menu")).json())
+    assert (await client.get("/menu/search", params={"min_price": -1})).status_code == 422
@@ -0,0 +1,87 @@
+"""
+Keyset pagination of GET /api/reservations
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 3, 1, 12, 0)
+
+
+def reservation(number: int, created_at: datetime, **fields) -> dict:
+    document = {
+        "id": f"r{number:03d}",
+        "name": f"Client {number}",
+        "phone": f"06{number:08d}",
+        "date": "2026-04-01",
+        "time": f"{12 + number % 10}:00",
+        "guests": 2,
+        "status": "pending",
+        "active": True,
+        "created_at": created_at,
+    }
+    document.update(fields)
+    return document
+
+
+async def pages(client, **params):
+    ids, cursor = [], None
+    while True:
+        response = await client.get("/reservations", params=dict(params, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200
+        ids.append([document["id"] for document in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return ids
+
+
+def test_cursors_round_trip():
+    assert decode_cursor(encode_cursor(START, "r001")) == (START, "r001")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+async def test_pages_walk_every_reservation_newest_first_once(client, database):
+    # Pairs share a created_at: the id breaks the tie
+    await database.reservations.insert_many([
+        reservation(number, START + timedelta(minutes=number // 2)) for number in range(10)
+    ])
+    walked = await pages(client, limit=3)
+    assert [len(page) for page in walked] == [3, 3, 3, 1]
+    assert sum(walked, []) == [f"r{number:03d}" for number in reversed(range(10))]
+
+
+async def test_filters_apply_to_every_page(client, database):
+    await database.reservations.insert_many([
+        reservation(number, START + timedelta(minutes=number), status="confirmed" if number % 2 else "pending")
+        for number in range(10)
+    ])
+    walked = await pages(client, limit=2, status="confirmed")
+    assert sum(walked, []) == ["r009", "r007", "r005", "r003", "r001"]
+    assert (await client.get("/reservations", params={"status": "lost"})).status_code == 400
+
+
+async def test_archived_reservations_are_merged_in_order(client, database):
+    documents = [reservation(number, START + timedelta(minutes=number)) for number in range(6)]
+    await database.reservations.insert_many(documents[1::2])
+    await database.reservations_archive.insert_many(documents[::2])
+    assert sum(await pages(client, limit=4), []) == ["r005", "r003", "r001"]
+    walked = await pages(client, limit=4, include_archived="true")
+    assert sum(walked, []) == [f"r{number:03d}" for number in reversed(range(6))]
+
+
+async def test_field_selection_keeps_the_cursor_working(client, database):
+    await database.reservations.insert_many([reservation(number, START + timedelta(minutes=number)) for number in range(3)])
+    response = await client.get("/reservations", params={"limit": 2, "fields": "name"})
+    assert set(response.json()[0]) <= {"id", "name", "created_at"}
+    cursor = response.headers["x-next-cursor"]
+    response = await client.get("/reservations", params={"limit": 2, "fields": "name", "cursor": cursor})
+    assert [document["id"] for document in response.json()] == ["r000"]
+
+
+async def test_a_malformed_cursor_is_a_400(client):
+    assert (await client.get("/reservations", params={"cursor": "%%%"})).status_code == 400
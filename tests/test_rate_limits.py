@@ -0,0 +1,131 @@
+"""
+Rate limiting and load shedding of the public write endpoints
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from pymongo.errors import ServerSelectionTimeoutError
+
+import limits
+from limits import MemoryRateLimitBackend, MongoRateLimitBackend, RateLimit, RateLimitMiddleware, route_class
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(limits.time, "monotonic", clock)
+    return clock
+
+
+async def test_buckets_allow_a_burst_then_refill_at_the_rate(clock):
+    backend = MemoryRateLimitBackend()
+    assert [await backend.take("ip", rate=0.5, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert await backend.take("ip", rate=0.5, burst=3) == pytest.approx(2.0)
+    # Other clients have buckets of their own
+    assert await backend.take("other", rate=0.5, burst=3) == 0
+    clock.now += 2.0
+    assert await backend.take("ip", rate=0.5, burst=3) == 0
+    assert await backend.take("ip", rate=0.5, burst=3) > 0
+    # A bucket never holds more than burst tokens
+    clock.now += 3600
+    assert [await backend.take("ip", rate=0.5, burst=3) for _ in range(4)][-1] > 0
+
+
+async def test_the_least_recently_used_buckets_are_dropped(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        await backend.take(key, rate=1, burst=1)
+    # "a" was forgotten, so it starts with a full bucket again
+    assert await backend.take("a", rate=1, burst=1) == 0
+    assert await backend.take("c", rate=1, burst=1) > 0
+
+
+async def test_the_shared_backend_lets_requests_through_when_mongo_is_down():
+    class Unavailable:
+        async def find_one_and_update(self, *args, **kwargs):
+            raise ServerSelectionTimeoutError("no primary")
+
+    assert await MongoRateLimitBackend(Unavailable()).take("ip", rate=1, burst=1) == 0
+
+
+def test_route_classes():
+    assert route_class("GET", "/api/menu") == "read"
+    assert route_class("POST", "/api/reservations") == "write"
+    assert route_class("GET", "/api/reservations/export") == "admin"
+    assert route_class("POST", "/api/admin/jobs/requeue") == "admin"
+    assert route_class("GET", "/api/health/ready") is None
+
+
+def limited_app(concurrency=None):
+    app = FastAPI()
+    gate = asyncio.Event()
+
+    @app.post("/api/reservations")
+    async def book():
+        return {"ok": True}
+
+    @app.post("/api/reviews")
+    async def review():
+        return {"ok": True}
+
+    @app.post("/api/slow")
+    async def slow():
+        await gate.wait()
+        return {"ok": True}
+
+    @app.get("/api/health/ready")
+    async def ready():
+        return {"ready": True}
+
+    middleware = RateLimitMiddleware(
+        app,
+        rules=[RateLimit("POST", "/api/reservations", rate=1 / 60, burst=2)],
+        backend=MemoryRateLimitBackend(),
+        concurrency=concurrency or {"read": 100, "write": 100, "admin": 100},
+    )
+    return middleware, gate
+
+
+def client_for(app, ip="203.0.113.1"):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 1234)), base_url="http://test")
+
+
+async def test_clients_over_their_rate_get_a_429():
+    app, _ = limited_app()
+    async with client_for(app) as client, client_for(app, "203.0.113.2") as neighbour:
+        assert [(await client.post("/api/reservations")).status_code for _ in range(2)] == [200, 200]
+        refused = await client.post("/api/reservations/")
+        assert refused.status_code == 429
+        assert 1 <= int(refused.headers["retry-after"]) <= 60
+        assert refused.json()["detail"]
+        assert (await neighbour.post("/api/reservations")).status_code == 200
+        # Other routes are not rate limited
+        assert [(await client.post("/api/reviews")).status_code for _ in range(3)] == [200, 200, 200]
+
+
+async def test_requests_over_the_concurrency_limit_are_shed():
+    app, gate = limited_app({"read": 100, "write": 1, "admin": 1})
+    async with client_for(app) as client:
+        held = asyncio.create_task(client.post("/api/slow"))
+        while app.in_flight["write"] == 0:
+            await asyncio.sleep(0.001)
+        shed = await client.post("/api/reservations")
+        assert (shed.status_code, shed.headers["retry-after"]) == (503, "1")
+        # Probes are never shed
+        assert (await client.get("/api/health/ready")).status_code == 200
+        gate.set()
+        assert (await held).status_code == 200
+        assert app.in_flight["write"] == 0
+        assert (await client.post("/api/reservations")).status_code == 200
@@ -0,0 +1,75 @@
+"""
+Review aggregates: incremental updates, rebuilds and the cached /reviews/stats
+"""
+import asyncio
+
+import pytest
+
+from cache import CacheInvalidator, ResponseCache
+from review_stats import read_review_stats, rebuild_review_stats, record_review
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_incremental_updates_match_a_rebuild(database):
+    ratings = [5, 4, 5, 3, 5]
+    await database.reviews.insert_many([{"rating": rating} for rating in ratings])
+    for rating in ratings:
+        await record_review(database.review_stats, rating)
+    incremental = await read_review_stats(database.review_stats)
+    assert incremental == {"count": 5, "average": 4.4, "histogram": {"1": 0, "2": 0, "3": 1, "4": 1, "5": 3}}
+
+    await database.review_stats.delete_many({})
+    assert (await read_review_stats(database.review_stats))["average"] is None
+    await rebuild_review_stats(database.reviews, database.review_stats)
+    assert await read_review_stats(database.review_stats) == incremental
+
+
+async def test_new_reviews_reach_the_cached_stats(client):
+    before = (await client.get("/reviews/stats")).json()
+    response = await client.post("/reviews", json={"name": "Lina", "rating": 1, "comment": "Trop sucré"})
+    assert response.status_code == 201
+    after = (await client.get("/reviews/stats")).json()
+    assert after["count"] == before["count"] + 1
+    assert after["histogram"]["1"] == before["histogram"]["1"] + 1
+
+
+class ChangeStream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            await asyncio.Event().wait()
+        return self.changes.pop(0)
+
+
+async def test_a_rebuild_from_the_command_line_invalidates_the_stats():
+    class Database:
+        def watch(self, pipeline):
+            assert "review_stats" in pipeline[0]["$match"]["ns.coll"]["$in"]
+            return ChangeStream([{"ns": {"coll": "review_stats"}}])
+
+    cache = ResponseCache()
+    cache.set("reviews", "stats", b"{}")
+    cache.set("menu", "", b"[]")
+    invalidator = CacheInvalidator(Database(), cache)
+    invalidator.start()
+    try:
+        for _ in range(100):
+            if cache.get("reviews", "stats") is None:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await invalidator.stop()
+    assert cache.get("reviews", "stats") is None
+    assert cache.get("menu") is not None
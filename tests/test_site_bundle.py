@@ -0,0 +1,77 @@
+"""
+Site bundle snapshot: rebuilds after writes
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from site_bundle import SiteBundle
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_failed_rebuild_leaves_the_bundle_stale(database):
+    await database.restaurant.insert_one({"name": "Avant"})
+    bundle = SiteBundle(database)
+    await bundle.ensure_built()
+    built = bundle.version
+
+    load = bundle._load
+
+    async def unavailable():
+        raise PyMongoError("primary unavailable")
+
+    bundle._load = unavailable
+    await database.restaurant.update_one({}, {"$set": {"name": "Après"}})
+    bundle.mark_stale("restaurant")
+    await bundle._rebuild
+    assert bundle.version == built
+
+    # The next request retries instead of serving the old snapshot for good
+    bundle._load = load
+    await bundle.ensure_built()
+    assert bundle.version != built
+    assert b"Apr" in bundle.body("identity")
+
+
+async def test_ensure_built_failing_is_retried_by_the_next_call(database):
+    await database.restaurant.insert_one({"name": "Avant"})
+    bundle = SiteBundle(database)
+    await bundle.ensure_built()
+    built = bundle.version
+    bundle._stale = True
+    load = bundle._load
+
+    async def unavailable():
+        raise PyMongoError("primary unavailable")
+
+    bundle._load = unavailable
+    with pytest.raises(PyMongoError):
+        await bundle.ensure_built()
+    bundle._load = load
+    await database.restaurant.update_one({}, {"$set": {"name": "Après"}})
+    await bundle.ensure_built()
+    assert bundle.version != built
+
+
+async def test_writes_during_a_build_trigger_one_more_build(database):
+    await database.restaurant.insert_one({"name": "Avant"})
+    bundle = SiteBundle(database)
+    await bundle.ensure_built()
+    builds = []
+    build = bundle.build
+
+    async def counted():
+        builds.append(None)
+        await asyncio.sleep(0.01)
+        return await build()
+
+    bundle.build = counted
+    bundle.mark_stale("menu")
+    await asyncio.sleep(0)
+    bundle.mark_stale("menu")
+    bundle.mark_stale("gallery")
+    await bundle._rebuild
+    assert len(builds) == 2
+    assert not bundle._stale
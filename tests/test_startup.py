@@ -0,0 +1,49 @@
+"""
+Background initialization and readiness
+"""
+import asyncio
+
+import pytest
+
+from seed_data import GALLERY_IMAGES, MENU_CATEGORIES, RESTAURANT_INFO
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ready_once_seeded(server, client, database):
+    assert (await client.get("/health/ready")).status_code == 200
+    assert await database.restaurant.count_documents({}) == 1
+    assert await database.menu_categories.count_documents({}) == len(MENU_CATEGORIES)
+
+
+class SlowToAnswer:
+    """Collection whose emptiness check lets the other workers run before it answers"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        document = await self.collection.find_one(*args, **kwargs)
+        await asyncio.sleep(0.01)
+        return document
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+async def test_workers_seeding_the_same_empty_database_write_each_document_once(server, database):
+    """launcher.py starts several workers, each seeding on startup"""
+    for collection in ("restaurant", "gallery"):
+        await database[collection].delete_many({})
+    await asyncio.gather(*(
+        server.seed_if_empty(SlowToAnswer(database.restaurant), [RESTAURANT_INFO], seed_id=lambda document: "restaurant")
+        for _ in range(4)
+    ), *(server.seed_if_empty(SlowToAnswer(database.gallery), GALLERY_IMAGES) for _ in range(4)))
+    assert await database.restaurant.count_documents({}) == 1
+    assert await database.gallery.count_documents({}) == len(GALLERY_IMAGES)
+
+
+async def test_seeding_leaves_a_populated_collection_alone(server, database):
+    await database.gallery.delete_many({"id": {"$ne": GALLERY_IMAGES[0]["id"]}})
+    assert not await server.seed_if_empty(database.gallery, GALLERY_IMAGES)
+    assert await database.gallery.count_documents({}) == 1